@@ -3,8 +3,15 @@ import os
 import time
 import tkinter as tk
 from tkinter import simpledialog, messagebox
+from ims_trace import span
+from capture_common import (AsyncImageWriter, CaptureStats, FrameGate, CaptureLayout, full_data_dir,
+                            parse_camera_indices, open_cameras, camera_filename, mosaic, get_next_image_index,
+                            capture_time_limit, gate_enabled, shortfall_message)
 
 def get_object_name():
+    preset_name = os.environ.get("IMS_OBJECT_NAME", "").strip().lower().replace(" ", "_")
+    if 0 < len(preset_name) <= 20 and preset_name.isalnum():
+        return preset_name
     root = tk.Tk()
     root.withdraw()
     while True:
@@ -18,13 +25,6 @@ def get_object_name():
     root.destroy()
     return object_name
 
-def get_next_image_index(save_dir, object_name):
-    existing_images = [f for f in os.listdir(save_dir) if f.startswith(object_name) and f.endswith('.jpg')]
-    if not existing_images:
-        return 1
-    existing_indices = [int(f.split('_')[-1].split('.')[0]) for f in existing_images]
-    return max(existing_indices) + 1
-
 def check_duplicate_object(object_name, save_dir):
     if os.path.exists(save_dir):
         root = tk.Tk()
@@ -54,22 +54,30 @@ def check_duplicate_object(object_name, save_dir):
 object_name = get_object_name()
 
 root_dir = os.environ.get("IMS_INSTALLATION_DIR", os.path.dirname(os.path.abspath(__file__)))
-save_dir = os.environ.get("IMS_DATA_DIR", os.path.join(root_dir, "data"))
-save_dir = os.path.join(save_dir, object_name)
+data_dir = os.environ.get("IMS_DATA_DIR", os.path.join(root_dir, "data"))
+save_dir = os.path.join(data_dir, object_name)
+full_dir = os.path.join(full_data_dir(data_dir), object_name)
 
 action = check_duplicate_object(object_name, save_dir)
 if action == 'overwrite':
-    if os.path.exists(save_dir):
-        for file in os.listdir(save_dir):
-            os.remove(os.path.join(save_dir, file))
+    for directory in (save_dir, full_dir):
+        if os.path.exists(directory):
+            for file in os.listdir(directory):
+                os.remove(os.path.join(directory, file))
 elif action == 'append':
     pass
 
-if not os.path.exists(save_dir):
-    os.makedirs(save_dir)
-
-cap = cv2.VideoCapture(0)
-cap.set(cv2.CAP_PROP_FPS, 30)
+layout = CaptureLayout(save_dir, full_dir=full_dir)
+
+try:
+    webcam_indices = parse_camera_indices(os.environ.get("IMS_CAMERAS", "0"))
+except ValueError:
+    webcam_indices = [0]
+try:
+    cameras = open_cameras(webcam_indices)
+except RuntimeError as e:
+    exit(str(e))
+multi_camera = len(cameras) > 1
 fps = 30
 
 if object_name.lower() == "noobject":
@@ -79,13 +87,26 @@ else:
 
 count = get_next_image_index(save_dir, object_name) - 1
 
+def release_cameras():
+    for camera in cameras:
+        camera.release()
+    cv2.destroyAllWindows()
+
 cv2.namedWindow("Image Capture", cv2.WINDOW_NORMAL)
 
+frame_ids = [0] * len(cameras)
 start_capture = False
 while not start_capture:
-    ret, frame = cap.read()
-    if not ret:
-        break
+    latest = [camera.read(frame_ids[i]) for i, camera in enumerate(cameras)]
+    stopped = [camera.index for camera in cameras if not camera.running]
+    if stopped:
+        release_cameras()
+        exit(f"Camera(s) {', '.join(map(str, stopped))} stopped delivering frames before capture started")
+    if any(frame is None or frame_id == frame_ids[i] for i, (frame_id, frame) in enumerate(latest)):
+        cv2.waitKey(1)
+        continue
+    frame_ids = [frame_id for frame_id, _ in latest]
+    frame = mosaic([frame for _, frame in latest]) if multi_camera else latest[0][1].copy()
     
     cv2.putText(frame, "Press 'S' to start capturing", (25, 250), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
     cv2.putText(frame, "Press 'E' to stop capturing", (25, 300), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 139), 2)
@@ -96,32 +117,65 @@ while not start_capture:
     if key == ord('s'):
         start_capture = True
     elif key == ord('e'):
-        cap.release()
-        cv2.destroyAllWindows()
+        release_cameras()
         exit("User exited before capture")
 
 start_time = time.time()
-while count < total_images:
-    ret, frame = cap.read()
-    if not ret:
+start_count = count
+ticks = 0
+capture_span = span("capture", object=object_name, cameras=len(cameras))
+writer = AsyncImageWriter(max_wait=1 / (fps * len(cameras)))
+gates = [FrameGate(enabled=gate_enabled(object_name)) for _ in cameras]
+stats = CaptureStats(writer, gates)
+time_limit = capture_time_limit(total_images - start_count, fps)
+stop_reason = None
+camera_failed = False
+while count < total_images and not camera_failed:
+    latest = [camera.read(frame_ids[i]) for i, camera in enumerate(cameras)]
+    ticks += 1
+    display_frames = []
+    for i, (frame_id, frame) in enumerate(latest):
+        if frame is None or not cameras[i].running:
+            camera_failed = True
+            break
+        display_frames.append(frame)
+        if frame_id == frame_ids[i] or count >= total_images:
+            continue
+        frame_ids[i] = frame_id
+
+        filename = camera_filename(object_name, count + 1, webcam_indices[i] if multi_camera else None)
+        keep, _ = gates[i].check(frame)
+        if keep and writer.submit(layout.targets(filename), frame):
+            gates[i].commit()
+            count += 1
+            stats.frame_kept()
+    if camera_failed:
         break
 
-    display_frame = frame.copy()
+    display_frame = mosaic(display_frames) if multi_camera else display_frames[0].copy()
     cv2.putText(display_frame, f"Captured: {count}/{total_images}", (50, 50), 
                 cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+    cv2.putText(display_frame, stats.overlay(), (50, 85), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
     cv2.imshow("Image Capture", display_frame)
 
-    img_path = os.path.join(save_dir, f"{object_name}_{count+1:03d}.jpg")
-    cv2.imwrite(img_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-    count += 1
-
     if cv2.waitKey(1) & 0xFF == ord('e'):
         break
+    if count < total_images:
+        stop_reason = stats.stop_reason(time_limit)
+        if stop_reason:
+            break
 
     elapsed_time = time.time() - start_time
-    if elapsed_time < count / fps:
-        time.sleep((count / fps) - elapsed_time)
-
-cap.release()
-cv2.destroyAllWindows()
+    if elapsed_time < ticks / fps:
+        time.sleep((ticks / fps) - elapsed_time)
+
+writer.close()
+blurry = stats.gate_total("blurry")
+redundant = stats.gate_total("redundant")
+if stop_reason:
+    print(shortfall_message(count, total_images, stop_reason, blurry, redundant))
+capture_span.end(frames=count - start_count, fps=round(stats.fps, 2), dropped=writer.dropped, failed=writer.failed,
+                 blurry=blurry, redundant=redundant, stopped=stop_reason)
+release_cameras()
 print(f"Captured {count} images of '{object_name}' in {save_dir}")
+print(f"Capture stats: {stats.summary()}")
\ No newline at end of file
@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import time
+import argparse
+import cv2
+from capture_common import configure_capture, fourcc_name, config_path, parse_camera_indices
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+FOURCCS = ["MJPG", "YUYV"]
+BUFFER_SIZES = [1, 4]
+TARGET_FPS = 30
+
+def parse_resolutions(text):
+    resolutions = []
+    for part in text.split(","):
+        width, height = part.lower().split("x")
+        resolutions.append((int(width), int(height)))
+    return resolutions
+
+def measure_latency(cap, frame_interval, samples=5):
+    latencies = []
+    for _ in range(samples):
+        time.sleep(frame_interval * 3)
+        stale = 0
+        while True:
+            start = time.perf_counter()
+            ret = cap.grab()
+            waited = time.perf_counter() - start
+            if not ret:
+                return None
+            if waited >= frame_interval / 2 or stale >= 10:
+                break
+            stale += 1
+        latencies.append(stale * frame_interval + waited)
+    return sum(latencies) / len(latencies) * 1000
+
+def probe_mode(index, width, height, fourcc, buffer_size, seconds):
+    cap = cv2.VideoCapture(index)
+    if not cap.isOpened():
+        return None
+    try:
+        settings = {"width": width, "height": height, "fourcc": fourcc, "fps": TARGET_FPS, "buffer_size": buffer_size}
+        configure_capture(cap, settings)
+        actual = {
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fourcc": fourcc_name(cap.get(cv2.CAP_PROP_FOURCC)) or None,
+            "fps": TARGET_FPS,
+            "buffer_size": int(cap.get(cv2.CAP_PROP_BUFFERSIZE)) or None
+        }
+        if (actual["width"], actual["height"]) != (width, height):
+            return None
+        if actual["fourcc"] is not None and actual["fourcc"].upper() != fourcc:
+            return None
+        for _ in range(5):
+            if not cap.read()[0]:
+                return None
+        frames = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            if not cap.read()[0]:
+                break
+            frames += 1
+        measured_fps = frames / max(time.perf_counter() - start, 1e-6)
+        latency_ms = measure_latency(cap, 1 / max(measured_fps, 1))
+        return {**actual, "measured_fps": round(measured_fps, 1),
+                "latency_ms": round(latency_ms, 1) if latency_ms is not None else None}
+    finally:
+        cap.release()
+
+def choose_best(results, min_fps):
+    usable = [r for r in results if r["measured_fps"] >= min_fps]
+    if not usable:
+        return max(results, key=lambda r: (r["measured_fps"], -(r["latency_ms"] or 1e9)))
+    return max(usable, key=lambda r: (r["width"] * r["height"], -(r["latency_ms"] or 1e9), r["measured_fps"]))
+
+def save_camera_settings(path, settings_by_camera):
+    config = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            config = json.load(f)
+    config.setdefault("camera", {}).update(settings_by_camera)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(config, f, indent=4)
+    os.replace(tmp_path, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Probe camera modes and store the best one in config.json")
+    parser.add_argument("--cameras", default=os.environ.get("IMS_CAMERAS") or "0", help="Camera indices, e.g. 0,1 (default: %(default)s)")
+    parser.add_argument("--resolutions", type=parse_resolutions, default=RESOLUTIONS, help="e.g. 640x480,1280x720")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Measurement time per mode (default: %(default)s)")
+    parser.add_argument("--min-fps", type=float, default=TARGET_FPS * 0.9, help="Lowest acceptable delivered fps (default: %(default)s)")
+    parser.add_argument("--config", default=config_path(), help="Config file to update (default: %(default)s)")
+    parser.add_argument("--no-save", action="store_true", help="Only print the results")
+    args = parser.parse_args()
+    try:
+        indices = parse_camera_indices(args.cameras)
+    except ValueError as e:
+        parser.error(f"invalid --cameras: {e}")
+    best_settings = {}
+    for index in indices:
+        print(f"Camera {index}:")
+        print(f"  {'mode':<24}{'fps':>8}{'latency ms':>12}")
+        results = []
+        for width, height in args.resolutions:
+            for fourcc in FOURCCS:
+                for buffer_size in BUFFER_SIZES:
+                    result = probe_mode(index, width, height, fourcc, buffer_size, args.seconds)
+                    label = f"{width}x{height} {fourcc} buf{buffer_size}"
+                    if result is None:
+                        print(f"  {label:<24}{'unsupported':>20}")
+                        continue
+                    if any((r["width"], r["height"], r["fourcc"], r["buffer_size"]) ==
+                           (result["width"], result["height"], result["fourcc"], result["buffer_size"]) for r in results):
+                        continue
+                    results.append(result)
+                    latency = f"{result['latency_ms']:.1f}" if result["latency_ms"] is not None else "-"
+                    print(f"  {label:<24}{result['measured_fps']:>8.1f}{latency:>12}")
+        if not results:
+            print(f"  No usable mode found for camera {index}")
+            continue
+        best = choose_best(results, args.min_fps)
+        best_settings[str(index)] = best
+        print(f"  Best: {best['width']}x{best['height']} {best['fourcc'] or 'default format'} "
+              f"buffer {best['buffer_size'] or 'default'}, "
+              f"{best['measured_fps']} fps, {best['latency_ms']} ms")
+    if not best_settings:
+        return 1
+    if not args.no_save:
+        save_camera_settings(args.config, best_settings)
+        print(f"Saved camera settings to {args.config}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
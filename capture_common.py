@@ -0,0 +1,333 @@
+import os
+import json
+import time
+import queue
+import threading
+import cv2
+import numpy as np
+from collections import deque
+
+JPEG_QUALITY = 70
+WRITER_THREADS = int(os.environ.get("IMS_WRITER_THREADS", 2))
+WRITER_QUEUE = int(os.environ.get("IMS_WRITER_QUEUE", 64))
+QUALITY_GATE = os.environ.get("IMS_QUALITY_GATE", "1") == "1"
+BLUR_THRESHOLD = float(os.environ.get("IMS_BLUR_THRESHOLD", 50))
+MIN_HASH_DISTANCE = int(os.environ.get("IMS_MIN_HASH_DISTANCE", 5))
+GATE_HISTORY = int(os.environ.get("IMS_GATE_HISTORY", 8))
+GATE_STALL_SECONDS = float(os.environ.get("IMS_GATE_STALL_SECONDS", 10))
+CAPTURE_TIME_FACTOR = float(os.environ.get("IMS_CAPTURE_TIME_FACTOR", 4))
+GATE_WIDTH = 320
+TRAIN_SIZE = 224
+CAPTURE_MODES = ("full", "train", "both")
+CAPTURE_MODE = os.environ.get("IMS_CAPTURE_MODE", "full")
+
+class AsyncImageWriter:
+    def __init__(self, workers=WRITER_THREADS, max_pending=WRITER_QUEUE, quality=JPEG_QUALITY, max_wait=1 / 30):
+        self.quality = quality
+        self.max_wait = max_wait
+        self.queue = queue.Queue(maxsize=max(1, max_pending))
+        self.lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.peak_depth = 0
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+    def submit(self, targets, image):
+        try:
+            self.queue.put((targets, image), timeout=self.max_wait)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            return False
+        with self.lock:
+            self.peak_depth = max(self.peak_depth, self.queue.qsize())
+        return True
+
+    def close(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            targets, image = item
+            ok = True
+            for path, transform in targets:
+                try:
+                    ok = cv2.imwrite(path, transform(image) if transform else image,
+                                     [cv2.IMWRITE_JPEG_QUALITY, self.quality]) and ok
+                except cv2.error:
+                    ok = False
+            with self.lock:
+                if ok:
+                    self.written += 1
+                else:
+                    self.failed += 1
+
+def letterbox(image, size=TRAIN_SIZE, color=(0, 0, 0)):
+    height, width = image.shape[:2]
+    scale = size / max(height, width)
+    new_width, new_height = max(1, round(width * scale)), max(1, round(height * scale))
+    resized = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+    top = (size - new_height) // 2
+    left = (size - new_width) // 2
+    return cv2.copyMakeBorder(resized, top, size - new_height - top, left, size - new_width - left,
+                              cv2.BORDER_CONSTANT, value=color)
+
+def full_data_dir(data_dir):
+    return os.environ.get("IMS_FULL_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(data_dir)), "data_full"))
+
+class CaptureLayout:
+    def __init__(self, save_dir, mode=CAPTURE_MODE, full_dir=None):
+        if mode not in CAPTURE_MODES:
+            raise ValueError(f"Unknown capture mode {mode}, expected one of {', '.join(CAPTURE_MODES)}")
+        self.mode = mode
+        self.save_dir = save_dir
+        self.full_dir = full_dir
+        os.makedirs(save_dir, exist_ok=True)
+        if mode == "both":
+            os.makedirs(full_dir, exist_ok=True)
+
+    def targets(self, filename):
+        if self.mode == "full":
+            return [(os.path.join(self.save_dir, filename), None)]
+        targets = [(os.path.join(self.save_dir, filename), letterbox)]
+        if self.mode == "both":
+            targets.append((os.path.join(self.full_dir, filename), None))
+        return targets
+
+def to_gray(image, width=GATE_WIDTH):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    if gray.shape[1] > width:
+        gray = cv2.resize(gray, (width, max(1, gray.shape[0] * width // gray.shape[1])), interpolation=cv2.INTER_AREA)
+    return gray
+
+def blur_score(gray):
+    return cv2.Laplacian(gray, cv2.CV_64F).var()
+
+def dhash(gray, size=8):
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+class FrameGate:
+    def __init__(self, enabled=QUALITY_GATE, blur_threshold=BLUR_THRESHOLD, min_distance=MIN_HASH_DISTANCE, history=GATE_HISTORY):
+        self.enabled = enabled
+        self.blur_threshold = blur_threshold
+        self.min_distance = min_distance
+        self.recent = deque(maxlen=max(1, history))
+        self.last_hash = None
+        self.kept = 0
+        self.blurry = 0
+        self.redundant = 0
+
+    def check(self, image):
+        self.last_hash = None
+        if not self.enabled:
+            return True, ""
+        gray = to_gray(image)
+        if blur_score(gray) < self.blur_threshold:
+            self.blurry += 1
+            return False, "blurry"
+        self.last_hash = dhash(gray)
+        if self.is_redundant(self.last_hash):
+            self.redundant += 1
+            return False, "redundant"
+        return True, ""
+
+    def commit(self):
+        if self.last_hash is not None:
+            self.recent.append(self.last_hash)
+        self.kept += 1
+
+    def is_redundant(self, frame_hash):
+        return any(bin(frame_hash ^ previous).count("1") < self.min_distance for previous in self.recent)
+
+    def check_hash(self, frame_hash):
+        if self.is_redundant(frame_hash):
+            self.redundant += 1
+            return False
+        self.recent.append(frame_hash)
+        self.kept += 1
+        return True
+
+    def summary(self):
+        if not self.enabled:
+            return "quality gate off"
+        return f"{self.kept} kept, {self.blurry} blurry, {self.redundant} redundant"
+
+def capture_time_limit(total_images, fps):
+    return max(GATE_STALL_SECONDS, total_images / fps * CAPTURE_TIME_FACTOR)
+
+def gate_enabled(object_name):
+    return QUALITY_GATE and object_name != "noobject"
+
+def shortfall_message(count, total_images, reason, blurry, redundant):
+    return (f"Stopped at {count}/{total_images} images because {reason} ({blurry} blurry, {redundant} redundant "
+            f"frames rejected). Move the object or camera, or relax the gate with IMS_QUALITY_GATE=0, "
+            f"IMS_BLUR_THRESHOLD or IMS_MIN_HASH_DISTANCE.")
+
+def get_next_image_index(save_dir, object_name):
+    if not os.path.isdir(save_dir):
+        return 1
+    existing_indices = []
+    for f in os.listdir(save_dir):
+        if f.startswith(object_name) and f.endswith('.jpg'):
+            try:
+                existing_indices.append(int(f.split('_')[-1].split('.')[0]))
+            except ValueError:
+                continue
+    return max(existing_indices) + 1 if existing_indices else 1
+
+def config_path():
+    root_dir = os.environ.get("IMS_INSTALLATION_DIR", os.path.dirname(os.path.abspath(__file__)))
+    return os.environ.get("IMS_CONFIG_FILE") or os.path.join(root_dir, "config.json")
+
+def load_camera_settings(index):
+    try:
+        with open(config_path(), "r") as f:
+            cameras = json.load(f).get("camera") or {}
+    except (OSError, ValueError):
+        return {}
+    return cameras.get(str(index)) or cameras.get("default") or {}
+
+def fourcc_name(value):
+    value = int(value)
+    return "".join(chr((value >> 8 * i) & 0xFF) for i in range(4)).strip("\x00")
+
+def configure_capture(cap, settings, fps=30):
+    if settings.get("fourcc"):
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*settings["fourcc"]))
+    if settings.get("width") and settings.get("height"):
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, settings["width"])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, settings["height"])
+    cap.set(cv2.CAP_PROP_FPS, settings.get("fps", fps))
+    if settings.get("buffer_size"):
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, settings["buffer_size"])
+
+def open_capture(index, fps=30):
+    cap = cv2.VideoCapture(index)
+    if cap.isOpened():
+        configure_capture(cap, load_camera_settings(index), fps)
+    return cap
+
+def parse_camera_indices(text):
+    indices = [int(part) for part in str(text).replace(" ", "").split(",") if part != ""]
+    if not indices:
+        raise ValueError("no camera index given")
+    if len(set(indices)) != len(indices):
+        raise ValueError("camera indices must be unique")
+    return indices
+
+class CameraReader:
+    def __init__(self, index, fps=30):
+        self.index = index
+        self.cap = open_capture(index, fps)
+        self.condition = threading.Condition()
+        self.frame = None
+        self.frame_id = 0
+        self.running = self.cap.isOpened()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        if self.running:
+            self.thread.start()
+
+    @property
+    def opened(self):
+        return self.cap.isOpened()
+
+    def _run(self):
+        while self.running:
+            ret, frame = self.cap.read()
+            with self.condition:
+                if not ret:
+                    self.running = False
+                else:
+                    self.frame = frame
+                    self.frame_id += 1
+                self.condition.notify_all()
+
+    def read(self, last_id=0, timeout=1.0):
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame_id != last_id or not self.running, timeout)
+            return self.frame_id, self.frame
+
+    def release(self):
+        with self.condition:
+            self.running = False
+        if self.thread.is_alive():
+            self.thread.join(timeout=2)
+        self.cap.release()
+
+def open_cameras(indices, fps=30):
+    cameras = [CameraReader(index, fps) for index in indices]
+    failed = [camera.index for camera in cameras if not camera.opened]
+    if failed:
+        for camera in cameras:
+            camera.release()
+        raise RuntimeError(f"Failed to open camera(s): {', '.join(map(str, failed))}")
+    return cameras
+
+def camera_filename(object_name, number, camera_index=None):
+    if camera_index is None:
+        return f"{object_name}_{number:03d}.jpg"
+    return f"{object_name}_cam{camera_index}_{number:03d}.jpg"
+
+def mosaic(frames, height=360):
+    tiles = [cv2.resize(frame, (max(1, frame.shape[1] * height // frame.shape[0]), height)) for frame in frames]
+    return np.hstack(tiles) if len(tiles) > 1 else tiles[0]
+
+class CaptureStats:
+    def __init__(self, writer, gates=()):
+        self.writer = writer
+        self.gates = list(gates)
+        self.start_time = time.time()
+        self.last_kept = self.start_time
+        self.frames = 0
+
+    def frame_kept(self):
+        self.frames += 1
+        self.last_kept = time.time()
+
+    def stop_reason(self, time_limit, stall_seconds=GATE_STALL_SECONDS):
+        now = time.time()
+        if now - self.last_kept > stall_seconds:
+            return f"no frame was kept for {stall_seconds:.0f}s"
+        if now - self.start_time > time_limit:
+            return f"the {time_limit:.0f}s time limit was reached"
+        return None
+
+    @property
+    def fps(self):
+        return self.frames / max(time.time() - self.start_time, 1e-6)
+
+    def overlay(self):
+        text = f"{self.fps:.1f} fps | queue {self.writer.depth} | dropped {self.writer.dropped}"
+        if any(gate.enabled for gate in self.gates):
+            text += f" | blurry {self.gate_total('blurry')} | redundant {self.gate_total('redundant')}"
+        return text
+
+    def gate_total(self, counter):
+        return sum(getattr(gate, counter) for gate in self.gates)
+
+    def summary(self):
+        text = (f"{self.fps:.1f} fps achieved, {self.writer.written} written, {self.writer.dropped} dropped, "
+                f"{self.writer.failed} failed, peak encoder queue {self.writer.peak_depth}")
+        if self.gates and not any(gate.enabled for gate in self.gates):
+            text += ", quality gate off"
+        elif self.gates:
+            text += (f", {self.gate_total('kept')} kept, {self.gate_total('blurry')} blurry, "
+                     f"{self.gate_total('redundant')} redundant")
+            if len(self.gates) > 1:
+                text += f" across {len(self.gates)} cameras"
+        return text
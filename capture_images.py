@@ -4,6 +4,11 @@ import time
 import tkinter as tk
 from tkinter import simpledialog, messagebox
 import subprocess
+import sys
+from ims_trace import span
+from capture_common import (AsyncImageWriter, CaptureStats, FrameGate, CaptureLayout, full_data_dir,
+                            parse_camera_indices, open_cameras, camera_filename, mosaic, get_next_image_index,
+                            capture_time_limit, gate_enabled, shortfall_message)
 
 class ObjectNameDialog(simpledialog.Dialog):
     def body(self, master):
@@ -16,6 +21,9 @@ class ObjectNameDialog(simpledialog.Dialog):
         self.object_name = self.entry.get().strip().lower().replace(" ", "_")
 
 def get_object_name():
+    preset_name = os.environ.pop("IMS_OBJECT_NAME", "").strip().lower().replace(" ", "_")
+    if 0 < len(preset_name) <= 20 and preset_name.isalnum():
+        return preset_name
     root = tk.Tk()
     root.withdraw()
     while True:
@@ -50,50 +58,55 @@ def check_duplicate_object(object_name):
             return check_duplicate_object(object_name)
     return 'new'
 
-def get_next_image_index(save_dir, object_name):
-    existing_images = [f for f in os.listdir(save_dir) if f.startswith(object_name) and f.endswith('.jpg')]
-    if not existing_images:
-        return 1
-    existing_indices = [int(f.split('_')[-1].split('.')[0]) for f in existing_images]
-    return max(existing_indices) + 1
-
 def select_webcam():
+    preset = os.environ.get("IMS_CAMERAS", "").strip()
+    if preset:
+        try:
+            return parse_camera_indices(preset)
+        except ValueError:
+            print(f"Ignoring invalid IMS_CAMERAS value: {preset}")
     root = tk.Tk()
     root.withdraw()
     while True:
-        dialog = simpledialog.askstring("Select Webcam", "Enter webcam index (0, 1, 2, ...):", parent=root)
+        dialog = simpledialog.askstring("Select Webcam", "Enter webcam index (0, 1, 2, ...) or several separated by commas (0,1):", parent=root)
         if dialog is None:
             exit("No webcam index provided!")
         try:
-            webcam_index = int(dialog)
+            webcam_indices = parse_camera_indices(dialog)
             break
         except ValueError:
-            messagebox.showerror("Invalid Input", "Please enter a valid integer for webcam index")
+            messagebox.showerror("Invalid Input", "Please enter one or more distinct integer webcam indices, e.g. 0 or 0,1")
     root.destroy()
-    return webcam_index
+    return webcam_indices
 
 while True:
     object_name = get_object_name()
     action = check_duplicate_object(object_name)
     save_dir = os.path.join(data_dir, object_name)
+    full_dir = os.path.join(full_data_dir(data_dir), object_name)
     if action == 'overwrite':
-        if os.path.exists(save_dir):
-            for file in os.listdir(save_dir):
-                os.remove(os.path.join(save_dir, file))
+        for directory in (save_dir, full_dir):
+            if os.path.exists(directory):
+                for file in os.listdir(directory):
+                    os.remove(os.path.join(directory, file))
         break
     elif action == 'append':
-        subprocess.run(["python", "append_images.py"])
+        subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "append_images.py")],
+                       env={**os.environ, "IMS_OBJECT_NAME": object_name})
         exit()
     elif action == 'cancel':
         exit("Operation cancelled by user.")
     else:
         break
 
-os.makedirs(save_dir, exist_ok=True)
+layout = CaptureLayout(save_dir, full_dir=full_dir)
 
-webcam_index = select_webcam()
-cap = cv2.VideoCapture(webcam_index)
-cap.set(cv2.CAP_PROP_FPS, 30)
+webcam_indices = select_webcam()
+try:
+    cameras = open_cameras(webcam_indices)
+except RuntimeError as e:
+    exit(str(e))
+multi_camera = len(cameras) > 1
 fps = 30
 capture_duration = 10
 total_images = min(1500, 300 if action == 'append' else fps * capture_duration)
@@ -117,23 +130,42 @@ def draw_rectangle(event, x, y, flags, param):
         drawing = False
         bottom_right = (x, y)
 
+def release_cameras():
+    for camera in cameras:
+        camera.release()
+    cv2.destroyAllWindows()
+
 cv2.namedWindow("Image Capture", cv2.WINDOW_NORMAL)
-cv2.setMouseCallback("Image Capture", draw_rectangle)
+if not multi_camera:
+    cv2.setMouseCallback("Image Capture", draw_rectangle)
 
+frame_ids = [0] * len(cameras)
 start_capture = False
 while not start_capture:
-    ret, frame = cap.read()
-    if not ret:
-        break
+    latest = [camera.read(frame_ids[i]) for i, camera in enumerate(cameras)]
+    stopped = [camera.index for camera in cameras if not camera.running]
+    if stopped:
+        release_cameras()
+        exit(f"Camera(s) {', '.join(map(str, stopped))} stopped delivering frames before capture started")
+    if any(frame is None or frame_id == frame_ids[i] for i, (frame_id, frame) in enumerate(latest)):
+        cv2.waitKey(1)
+        continue
+    frame_ids = [frame_id for frame_id, _ in latest]
+    frame = mosaic([frame for _, frame in latest]) if multi_camera else latest[0][1].copy()
 
     if top_left and bottom_right:
         box_color = (255, 0, 0) if confirmed_box else (0, 255, 0)
         cv2.rectangle(frame, top_left, bottom_right, box_color, 2)
 
-    cv2.putText(frame, "Draw box, ESC to reset, Y to confirm", (25, 200), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-    cv2.putText(frame, "Press 'S' to start capturing", (25, 250), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-    cv2.putText(frame, "Press 'E' to stop capturing", (25, 300), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 139), 2)
-    cv2.putText(frame, f"Object: {object_name}", (25, 350), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+    if multi_camera:
+        cv2.putText(frame, f"Cameras: {', '.join(map(str, webcam_indices))}", (25, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        cv2.putText(frame, "Press 'S' to start, 'E' to stop", (25, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+        cv2.putText(frame, f"Object: {object_name}", (25, 110), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+    else:
+        cv2.putText(frame, "Draw box, ESC to reset, Y to confirm", (25, 200), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        cv2.putText(frame, "Press 'S' to start capturing", (25, 250), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        cv2.putText(frame, "Press 'E' to stop capturing", (25, 300), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 139), 2)
+        cv2.putText(frame, f"Object: {object_name}", (25, 350), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
     cv2.imshow("Image Capture", frame)
 
     key = cv2.waitKey(1)
@@ -151,42 +183,74 @@ while not start_capture:
             print("Please confirm the bounding box (press 'Y') or press 'S' without drawing a box to capture full frame.")
             continue
     elif key == ord('e'):
-        cap.release()
-        cv2.destroyAllWindows()
+        release_cameras()
         exit("User exited before capture")
 
 start_time = time.time()
-while count < total_images:
-    ret, frame = cap.read()
-    if not ret:
-        break
+start_count = count
+ticks = 0
+capture_span = span("capture", object=object_name, cameras=len(cameras))
+writer = AsyncImageWriter(max_wait=1 / (fps * len(cameras)))
+gates = [FrameGate(enabled=gate_enabled(object_name)) for _ in cameras]
+stats = CaptureStats(writer, gates)
+time_limit = capture_time_limit(total_images - start_count, fps)
+stop_reason = None
+camera_failed = False
+while count < total_images and not camera_failed:
+    latest = [camera.read(frame_ids[i]) for i, camera in enumerate(cameras)]
+    ticks += 1
+    display_frames = []
+    for i, (frame_id, frame) in enumerate(latest):
+        if frame is None or not cameras[i].running:
+            camera_failed = True
+            break
+        display_frames.append(frame)
+        if frame_id == frame_ids[i] or count >= total_images:
+            continue
+        frame_ids[i] = frame_id
 
-    if top_left and bottom_right and confirmed_box:
-        x1, y1 = top_left
-        x2, y2 = bottom_right
-        cropped_frame = frame[min(y1, y2):max(y1, y2), min(x1, x2):max(x1, x2)]
-    else:
-        cropped_frame = frame
+        if top_left and bottom_right and confirmed_box:
+            x1, y1 = top_left
+            x2, y2 = bottom_right
+            cropped_frame = frame[min(y1, y2):max(y1, y2), min(x1, x2):max(x1, x2)]
+        else:
+            cropped_frame = frame
 
-    window_height, window_width = frame.shape[:2]
-    resized_frame = cv2.resize(cropped_frame, (window_width, window_height))
+        filename = camera_filename(object_name, count + 1, webcam_indices[i] if multi_camera else None)
+        keep, _ = gates[i].check(cropped_frame)
+        if keep and writer.submit(layout.targets(filename), cropped_frame):
+            gates[i].commit()
+            count += 1
+            stats.frame_kept()
+    if camera_failed:
+        break
 
-    display_frame = resized_frame.copy()
+    display_frame = mosaic(display_frames) if multi_camera else display_frames[0].copy()
+    if top_left and bottom_right and confirmed_box:
+        cv2.rectangle(display_frame, top_left, bottom_right, (255, 0, 0), 2)
     cv2.putText(display_frame, f"Captured: {count}/{total_images}", (10, 30),
                 cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+    cv2.putText(display_frame, stats.overlay(), (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
     cv2.imshow("Image Capture", display_frame)
 
-    img_path = os.path.join(save_dir, f"{object_name}_{count+1:03d}.jpg")
-    cv2.imwrite(img_path, cropped_frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-    count += 1
-
     if cv2.waitKey(1) & 0xFF == ord('e'):
         break
+    if count < total_images:
+        stop_reason = stats.stop_reason(time_limit)
+        if stop_reason:
+            break
 
     elapsed_time = time.time() - start_time
-    if elapsed_time < count / fps:
-        time.sleep((count / fps) - elapsed_time)
+    if elapsed_time < ticks / fps:
+        time.sleep((ticks / fps) - elapsed_time)
 
-cap.release()
-cv2.destroyAllWindows()
-print(f"Captured {count} images of '{object_name}' in {save_dir}")
\ No newline at end of file
+writer.close()
+blurry = stats.gate_total("blurry")
+redundant = stats.gate_total("redundant")
+if stop_reason:
+    print(shortfall_message(count, total_images, stop_reason, blurry, redundant))
+capture_span.end(frames=count - start_count, fps=round(stats.fps, 2), dropped=writer.dropped, failed=writer.failed,
+                 blurry=blurry, redundant=redundant, stopped=stop_reason)
+release_cameras()
+print(f"Captured {count} images of '{object_name}' in {save_dir}")
+print(f"Capture stats: {stats.summary()}")
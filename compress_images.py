@@ -1,10 +1,37 @@
 from PIL import Image, ImageEnhance
+import io
 import os
+import sys
+import json
+import shutil
+import queue
+import argparse
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import threading
+from concurrent.futures import ProcessPoolExecutor
 import cv2
 import numpy as np
+from status_channel import JobReporter
+from ims_trace import span
+from copy_engine import file_hash
+from control_channel import ControlState, ControlServer, controlled_map
+
+CHUNK_SIZE = 32
+POLL_INTERVAL_MS = 100
+MAX_QUALITY = 95
+MIN_QUALITY = 20
+QUALITY_TOLERANCE = 2
+MAX_DOWNSCALE_ROUNDS = 4
+MIN_DIMENSION = 64
+LEDGER_NAME = ".ims_compress_ledger.json"
+LEDGER_SAVE_EVERY = 20
+MODE_SETTINGS = {
+    "compress": ["quality"],
+    "enhance": ["brightness", "contrast", "sharpness"],
+    "auto": ["quality", "brightness", "contrast", "sharpness", "target_size"],
+    "target": ["target_size", "allow_downscale", "min_quality"]
+}
 
 class ImageProcessor:
     def __init__(self, root):
@@ -20,6 +47,8 @@ class ImageProcessor:
             self.input_dir = default_dir
             self.output_dir = default_dir
         
+        self.updates = queue.Queue()
+        self.worker = None
         self.setup_ui()
         
     def setup_ui(self):
@@ -32,6 +61,14 @@ class ImageProcessor:
         self.dir_var = tk.StringVar(value=self.input_dir)
         ttk.Entry(dir_frame, textvariable=self.dir_var, width=50).grid(row=0, column=0, padx=5, pady=5)
         ttk.Button(dir_frame, text="Browse", command=self.browse_directory).grid(row=0, column=1, padx=5, pady=5)
+        ttk.Label(dir_frame, text="Output folder (empty = overwrite in place):").grid(row=1, column=0, sticky=tk.W, padx=5)
+        same_dir = os.path.abspath(self.output_dir) == os.path.abspath(self.input_dir)
+        self.output_var = tk.StringVar(value="" if same_dir else self.output_dir)
+        ttk.Entry(dir_frame, textvariable=self.output_var, width=50).grid(row=2, column=0, padx=5, pady=5)
+        ttk.Button(dir_frame, text="Browse", command=self.browse_output_directory).grid(row=2, column=1, padx=5, pady=5)
+        self.force_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(dir_frame, text="Reprocess images already recorded in the ledger",
+                        variable=self.force_var).grid(row=3, column=0, sticky=tk.W, padx=5)
         
         quality_frame = ttk.LabelFrame(main_frame, text="Quality Settings", padding="5")
         quality_frame.pack(fill=tk.X, pady=5)
@@ -73,6 +110,9 @@ class ImageProcessor:
         ttk.Label(size_frame, text="Target file size (KB):").pack(side=tk.LEFT, padx=5)
         self.target_size_var = tk.IntVar(value=200)
         ttk.Entry(size_frame, textvariable=self.target_size_var, width=6).pack(side=tk.LEFT, padx=5)
+        self.allow_downscale_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(size_frame, text="Allow downscaling to reach target",
+                        variable=self.allow_downscale_var).pack(side=tk.LEFT, padx=5)
         
         self.progress_var = tk.DoubleVar(value=0)
         self.progress = ttk.Progressbar(main_frame, variable=self.progress_var, maximum=100)
@@ -86,97 +126,387 @@ class ImageProcessor:
         ttk.Button(btn_frame, text="Compress Images", command=self.compress_images).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="Enhance Images", command=self.enhance_images).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="Process (Auto)", command=self.auto_process).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Fit Target Size", command=self.target_process).pack(side=tk.LEFT, padx=5)
     
     def browse_directory(self):
         directory = filedialog.askdirectory(initialdir=self.dir_var.get())
         if directory:
             self.dir_var.set(directory)
     
+    def browse_output_directory(self):
+        directory = filedialog.askdirectory(initialdir=self.output_var.get() or self.dir_var.get())
+        if directory:
+            self.output_var.set(directory)
+    
+    def collect_settings(self):
+        return {
+            "quality": self.quality_var.get(),
+            "brightness": self.brightness_var.get(),
+            "contrast": self.contrast_var.get(),
+            "sharpness": self.sharpness_var.get(),
+            "target_size": self.target_size_var.get() * 1024,
+            "allow_downscale": self.allow_downscale_var.get(),
+            "min_quality": MIN_QUALITY
+        }
+    
     def process_images(self, mode='compress'):
-        root_dir = self.dir_var.get()
-        quality = self.quality_var.get()
-        brightness = self.brightness_var.get()
-        contrast = self.contrast_var.get()
-        sharpness = self.sharpness_var.get()
-        target_size = self.target_size_var.get() * 1024
-        
-        image_files = []
-        for root, _, files in os.walk(root_dir):
-            for file in files:
-                if file.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    image_files.append(os.path.join(root, file))
-        
-        if not image_files:
-            messagebox.showinfo("No Images", "No image files found in the selected directory.")
+        if self.worker is not None and self.worker.is_alive():
+            messagebox.showinfo("Busy", "Images are already being processed.")
             return
-        
-        processed = 0
-        for idx, file_path in enumerate(image_files):
-            try:
-                file_size = os.path.getsize(file_path)
-                
-                if mode == 'auto':
-                    if file_size > target_size:
-                        self._compress_image(file_path, quality)
-                        action = "Compressed"
-                    else:
-                        self._enhance_image(file_path, brightness, contrast, sharpness)
-                        action = "Enhanced"
-                elif mode == 'compress':
-                    self._compress_image(file_path, quality)
-                    action = "Compressed"
-                else:
-                    self._enhance_image(file_path, brightness, contrast, sharpness)
-                    action = "Enhanced"
-                
-                processed += 1
-                self.status_var.set(f"{action}: {file_path}")
-                self.progress_var.set((idx + 1) / len(image_files) * 100)
-                self.root.update_idletasks()
-                
-            except Exception as e:
-                print(f"Failed to process {file_path}: {e}")
-        
-        self.status_var.set(f"Completed! Processed {processed} images.")
-        messagebox.showinfo("Complete", f"Processed {processed} out of {len(image_files)} images.")
+        root_dir = self.dir_var.get()
+        output_dir = self.output_var.get().strip() or None
+        settings = self.collect_settings()
+        self.progress_var.set(0)
+        self.status_var.set("Scanning images...")
+        self.worker = threading.Thread(target=self._run_batch, args=(root_dir, mode, settings, output_dir, self.force_var.get()),
+                                       daemon=True)
+        self.worker.start()
+        self.root.after(POLL_INTERVAL_MS, self.poll_updates)
     
-    def _compress_image(self, file_path, quality):
+    def _run_batch(self, root_dir, mode, settings, output_dir, force):
         try:
-            with Image.open(file_path) as img:
-                img.save(file_path, optimize=True, quality=quality)
+            processed, total = run_batch(root_dir, mode, settings, output_dir=output_dir, force=force,
+                                         on_progress=lambda *update: self.updates.put(("progress",) + update))
+            self.updates.put(("done", processed, total))
         except Exception as e:
-            print(f"Error compressing image {file_path}: {e}")
+            self.updates.put(("error", str(e)))
     
-    def _enhance_image(self, file_path, brightness, contrast, sharpness):
-        try:
-            with Image.open(file_path) as img:
-                if brightness != 1.0:
-                    enhancer = ImageEnhance.Brightness(img)
-                    img = enhancer.enhance(brightness)
-                
-                if contrast != 1.0:
-                    enhancer = ImageEnhance.Contrast(img)
-                    img = enhancer.enhance(contrast)
-                
-                if sharpness != 1.0:
-                    enhancer = ImageEnhance.Sharpness(img)
-                    img = enhancer.enhance(sharpness)
-                
-                img.save(file_path, quality=95)
-        except Exception as e:
-            print(f"Error enhancing image {file_path}: {e}")
+    def poll_updates(self):
+        finished = False
+        latest = None
+        while True:
+            try:
+                update = self.updates.get_nowait()
+            except queue.Empty:
+                break
+            if update[0] == "progress":
+                latest = update
+            elif update[0] == "done":
+                finished = True
+                _, processed, total = update
+                if total == 0:
+                    self.status_var.set("Ready")
+                    messagebox.showinfo("No Images", "No image files found in the selected directory.")
+                else:
+                    self.progress_var.set(100)
+                    self.status_var.set(f"Completed! Processed {processed} images.")
+                    messagebox.showinfo("Complete", f"Processed {processed} out of {total} images.")
+            else:
+                finished = True
+                self.status_var.set(f"Failed: {update[1]}")
+                messagebox.showerror("Error", f"Image processing failed: {update[1]}")
+        if latest is not None and not finished:
+            _, done, total, message = latest
+            self.progress_var.set(done / total * 100 if total else 0)
+            self.status_var.set(message)
+        if not finished:
+            self.root.after(POLL_INTERVAL_MS, self.poll_updates)
     
     def compress_images(self):
-        threading.Thread(target=self.process_images, args=('compress',)).start()
+        self.process_images('compress')
     
     def enhance_images(self):
-        threading.Thread(target=self.process_images, args=('enhance',)).start()
+        self.process_images('enhance')
     
     def auto_process(self):
-        threading.Thread(target=self.process_images, args=('auto',)).start()
+        self.process_images('auto')
+    
+    def target_process(self):
+        self.process_images('target')
 
-if __name__ == "__main__":
-    root = tk.Tk()
-    app = ImageProcessor(root)
-    root.mainloop()
+def list_images(root_dir, exclude_dir=None):
+    exclude_dir = os.path.abspath(exclude_dir) if exclude_dir else None
+    image_files = []
+    for root, dirs, files in os.walk(root_dir):
+        if exclude_dir:
+            dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != exclude_dir]
+        for file in files:
+            if file.lower().endswith(('.jpg', '.jpeg', '.png')):
+                image_files.append(os.path.join(root, file))
+    return image_files
+
+def image_format(path):
+    return "PNG" if path.lower().endswith('.png') else "JPEG"
+
+def atomic_write(dst, write):
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    tmp_path = f"{dst}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def write_bytes(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+def copy_unchanged(src, dst):
+    if os.path.abspath(src) != os.path.abspath(dst):
+        atomic_write(dst, lambda tmp_path: shutil.copy2(src, tmp_path))
+
+def compress_image(src, dst, quality):
+    with Image.open(src) as img:
+        img.load()
+    atomic_write(dst, lambda tmp_path: img.save(tmp_path, format=image_format(dst), optimize=True, quality=quality))
 
+def enhance_image(src, dst, brightness, contrast, sharpness):
+    with Image.open(src) as img:
+        img.load()
+    if brightness != 1.0:
+        img = ImageEnhance.Brightness(img).enhance(brightness)
+    if contrast != 1.0:
+        img = ImageEnhance.Contrast(img).enhance(contrast)
+    if sharpness != 1.0:
+        img = ImageEnhance.Sharpness(img).enhance(sharpness)
+    atomic_write(dst, lambda tmp_path: img.save(tmp_path, format=image_format(dst), quality=95))
+
+def encode_jpeg(img, quality):
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+def search_quality(img, target_size, min_quality=MIN_QUALITY, max_quality=MAX_QUALITY):
+    best = encode_jpeg(img, max_quality)
+    if len(best) <= target_size:
+        return max_quality, best, 1
+    smallest = encode_jpeg(img, min_quality)
+    encodes = 2
+    if len(smallest) > target_size:
+        return None, smallest, encodes
+    low, high, best = min_quality, max_quality, (min_quality, smallest)
+    while high - low > QUALITY_TOLERANCE:
+        quality = (low + high) // 2
+        data = encode_jpeg(img, quality)
+        encodes += 1
+        if len(data) <= target_size:
+            low, best = quality, (quality, data)
+        else:
+            high = quality
+    return best[0], best[1], encodes
+
+def fit_target_size(src, dst, target_size, allow_downscale=False, min_quality=MIN_QUALITY):
+    if not src.lower().endswith(('.jpg', '.jpeg')):
+        copy_unchanged(src, dst)
+        return "Skipped (not a JPEG)"
+    if os.path.getsize(src) <= target_size:
+        copy_unchanged(src, dst)
+        return "Already within target"
+    with Image.open(src) as img:
+        img.load()
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    quality, data, encodes = search_quality(img, target_size, min_quality)
+    rounds = 0
+    while quality is None and allow_downscale and rounds < MAX_DOWNSCALE_ROUNDS and min(img.size) > MIN_DIMENSION:
+        scale = max(0.5, min(0.95, (target_size / len(data)) ** 0.5 * 0.95))
+        img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.LANCZOS)
+        quality, data, more = search_quality(img, target_size, min_quality)
+        encodes += more
+        rounds += 1
+    if quality is None:
+        copy_unchanged(src, dst)
+        return f"Kept original, smallest encode {len(data) // 1024} KB still above target ({encodes} encodes)"
+    atomic_write(dst, lambda tmp_path: write_bytes(tmp_path, data))
+    resized = f", resized to {img.width}x{img.height}" if rounds else ""
+    return f"Fit at quality {quality}{resized} ({encodes} encodes)"
+
+def process_file(src, dst, mode, settings):
+    if mode == 'target':
+        return fit_target_size(src, dst, settings["target_size"], settings.get("allow_downscale", False),
+                               settings.get("min_quality", MIN_QUALITY))
+    if mode == 'auto':
+        mode = 'compress' if os.path.getsize(src) > settings["target_size"] else 'enhance'
+    if mode == 'compress':
+        compress_image(src, dst, settings["quality"])
+        return "Compressed"
+    enhance_image(src, dst, settings["brightness"], settings["contrast"], settings["sharpness"])
+    return "Enhanced"
+
+def settings_key(mode, settings):
+    return json.dumps({"mode": mode, **{name: settings.get(name) for name in MODE_SETTINGS[mode]}}, sort_keys=True)
+
+def load_ledger(path):
+    try:
+        with open(path, "r") as f:
+            ledger = json.load(f)
+        return ledger if isinstance(ledger, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def save_ledger(path, ledger):
+    atomic_write(path, lambda tmp_path: write_bytes(tmp_path, json.dumps(ledger, indent=1, sort_keys=True).encode("utf-8")))
+
+def folder_ledger(ledgers, folder):
+    if folder not in ledgers:
+        ledgers[folder] = load_ledger(os.path.join(folder, LEDGER_NAME))
+    return ledgers[folder]
+
+def save_ledgers(ledgers, prune=False):
+    for folder, ledger in ledgers.items():
+        if prune:
+            for name in [name for name in ledger if not os.path.exists(os.path.join(folder, name))]:
+                del ledger[name]
+        if ledger or os.path.exists(os.path.join(folder, LEDGER_NAME)):
+            save_ledger(os.path.join(folder, LEDGER_NAME), ledger)
+
+def stat_matches(path, size, mtime_ns):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return stat.st_size == size and stat.st_mtime_ns == mtime_ns
+
+def ledger_quick_match(entry, src, dst, key):
+    if not entry or entry.get("settings") != key:
+        return False
+    if not stat_matches(dst, entry["output_size"], entry["output_mtime_ns"]):
+        return False
+    return os.path.abspath(src) == os.path.abspath(dst) or stat_matches(src, entry["input_size"], entry["input_mtime_ns"])
+
+def ledger_hash_match(entry, src, dst, key):
+    if not entry or entry.get("settings") != key or not os.path.exists(dst):
+        return False
+    if os.path.getsize(dst) != entry["output_size"] or file_hash(dst) != entry["output_hash"]:
+        return False
+    return os.path.abspath(src) == os.path.abspath(dst) or file_hash(src) == entry["input_hash"]
+
+def make_entry(key, src, dst, input_hash, input_stat):
+    output_stat = os.stat(dst)
+    if os.path.abspath(src) != os.path.abspath(dst):
+        input_stat = os.stat(src)
+    return {
+        "settings": key,
+        "input_hash": input_hash,
+        "input_size": input_stat.st_size,
+        "input_mtime_ns": input_stat.st_mtime_ns,
+        "output_hash": file_hash(dst),
+        "output_size": output_stat.st_size,
+        "output_mtime_ns": output_stat.st_mtime_ns
+    }
+
+def process_chunk(items, mode, settings, key):
+    results = []
+    for rel_path, src, dst, entry in items:
+        try:
+            if ledger_hash_match(entry, src, dst, key):
+                results.append((rel_path, "Skipped (unchanged)", None, make_entry(key, src, dst, entry["input_hash"], os.stat(src))))
+                continue
+            input_stat = os.stat(src)
+            input_hash = file_hash(src)
+            action = process_file(src, dst, mode, settings)
+            results.append((rel_path, action, None, make_entry(key, src, dst, input_hash, input_stat)))
+        except Exception as e:
+            results.append((rel_path, None, str(e), None))
+    return results
+
+def run_batch(root_dir, mode, settings, on_progress=None, workers=None, chunk_size=CHUNK_SIZE, output_dir=None, force=False,
+              control_state=None):
+    if output_dir and os.path.abspath(output_dir) == os.path.abspath(root_dir):
+        output_dir = None
+    dest_root = output_dir or root_dir
+    with span("image_scan", directory=root_dir) as scan_span:
+        image_files = list_images(root_dir, exclude_dir=output_dir)
+        scan_span.set(files=len(image_files))
+    if not image_files:
+        return 0, 0
+    key = settings_key(mode, settings)
+    ledgers = {}
+    pending = []
+    skipped = 0
+    for src in image_files:
+        rel_path = os.path.relpath(src, root_dir).replace(os.sep, "/")
+        dst = os.path.join(dest_root, rel_path)
+        ledger = folder_ledger(ledgers, os.path.dirname(dst))
+        entry = None if force else ledger.get(os.path.basename(dst))
+        if ledger_quick_match(entry, src, dst, key):
+            skipped += 1
+        else:
+            pending.append((rel_path, src, dst, entry))
+    total = len(image_files)
+    control_state = control_state or ControlState()
+    control_server = ControlServer(control_state, port=0)
+    reporter = JobReporter("compress", total=total, unit="images", control_port=control_server.start_with_fallback())
+    compression_span = span("compression", mode=mode, files=total, unchanged=skipped)
+    processed = skipped
+    done = skipped
+    last_action = "Processing"
+    try:
+        if pending:
+            chunks = [pending[start:start + chunk_size] for start in range(0, len(pending), chunk_size)]
+            window = (workers or os.cpu_count() or 1) * 2
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                jobs = [(chunk, mode, settings, key) for chunk in chunks]
+                for completed, (index, future) in enumerate(controlled_map(pool, process_chunk, jobs, control_state, window), 1):
+                    dst_paths = {rel_path: dst for rel_path, _, dst, _ in chunks[index]}
+                    for rel_path, action, error, entry in future.result():
+                        done += 1
+                        ledger = ledgers[os.path.dirname(dst_paths[rel_path])]
+                        if error is not None:
+                            ledger.pop(os.path.basename(dst_paths[rel_path]), None)
+                            print(f"Failed to process {rel_path}: {error}")
+                            continue
+                        ledger[os.path.basename(dst_paths[rel_path])] = entry
+                        processed += 1
+                        if action.startswith("Skipped (unchanged)"):
+                            skipped += 1
+                        last_action = f"{action}: {os.path.basename(rel_path)}"
+                    message = f"{last_action} ({done}/{total})"
+                    reporter.update(done, message)
+                    if on_progress:
+                        on_progress(done, total, message)
+                    if completed % LEDGER_SAVE_EVERY == 0 or control_state.take_checkpoint_request():
+                        save_ledgers(ledgers)
+    except BaseException:
+        save_ledgers(ledgers)
+        compression_span.end(ok=False, processed=processed, skipped=skipped)
+        reporter.finish("Image processing failed", state="failed")
+        raise
+    finally:
+        control_server.stop()
+    stopped = control_state.stop_event.is_set() and done < total
+    save_ledgers(ledgers, prune=True)
+    compression_span.end(processed=processed, skipped=skipped, stopped=stopped)
+    summary = f"Processed {processed} of {total} images ({skipped} already up to date)"
+    if stopped:
+        summary = f"Stopped: {summary[0].lower()}{summary[1:]}"
+    if on_progress:
+        on_progress(done, total, summary)
+    reporter.finish(summary, state="interrupted" if stopped else "finished")
+    return processed, total
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress or enhance every image under a folder")
+    parser.add_argument("--headless", action="store_true", help="Process without opening the window")
+    parser.add_argument("--input", default=os.getenv("IMS_INPUT_DIR") or os.path.join("C://IMS", "data"), help="Folder to process (default: %(default)s)")
+    parser.add_argument("--output", default=os.getenv("IMS_OUTPUT_DIR") or None,
+                        help="Write results here instead of overwriting the input (default: IMS_OUTPUT_DIR)")
+    parser.add_argument("--force", action="store_true", help="Reprocess images already recorded in the ledger")
+    parser.add_argument("--mode", choices=("compress", "enhance", "auto", "target"), default="compress",
+                        help="'target' finds the highest JPEG quality that fits --target-kb (default: %(default)s)")
+    parser.add_argument("--quality", type=int, default=50, help="JPEG quality for compression (default: %(default)s)")
+    parser.add_argument("--brightness", type=float, default=1.0)
+    parser.add_argument("--contrast", type=float, default=1.0)
+    parser.add_argument("--sharpness", type=float, default=1.0)
+    parser.add_argument("--target-kb", type=int, default=200, help="Size limit for auto and target modes (default: %(default)s)")
+    parser.add_argument("--allow-downscale", action="store_true", help="Target mode may shrink images that miss the target at minimum quality")
+    parser.add_argument("--min-quality", type=int, default=MIN_QUALITY, help="Lowest JPEG quality target mode may use (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+    if not args.headless:
+        root = tk.Tk()
+        app = ImageProcessor(root)
+        root.mainloop()
+        return 0
+    settings = {"quality": args.quality, "brightness": args.brightness, "contrast": args.contrast,
+                "sharpness": args.sharpness, "target_size": args.target_kb * 1024,
+                "allow_downscale": args.allow_downscale, "min_quality": args.min_quality}
+    processed, total = run_batch(args.input, args.mode, settings, workers=args.workers, output_dir=args.output, force=args.force,
+                                 on_progress=lambda done, total, message: print(f"{done}/{total} {message}", flush=True))
+    print(f"Processed {processed} of {total} images in {args.input}")
+    return 0 if processed == total else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+import os
+import socket
+import json
+import threading
+import logging
+from concurrent.futures import wait, FIRST_COMPLETED
+
+CONTROL_HOST = "127.0.0.1"
+CONTROL_PORT = int(os.environ.get("IMS_CONTROL_PORT", 5679))
+COMMANDS = ("stop", "pause", "resume", "checkpoint", "status")
+
+class ControlState:
+    def __init__(self, stop_event=None):
+        self.stop_event = stop_event or threading.Event()
+        self.resume_event = threading.Event()
+        self.resume_event.set()
+        self.checkpoint_event = threading.Event()
+
+    @property
+    def paused(self):
+        return not self.resume_event.is_set()
+
+    def snapshot(self):
+        return {
+            "stopping": self.stop_event.is_set(),
+            "paused": self.paused,
+            "checkpoint_pending": self.checkpoint_event.is_set()
+        }
+
+    def handle(self, command):
+        if command == "stop":
+            self.stop_event.set()
+            self.resume_event.set()
+        elif command == "pause":
+            self.resume_event.clear()
+        elif command == "resume":
+            self.resume_event.set()
+        elif command == "checkpoint":
+            self.checkpoint_event.set()
+        elif command != "status":
+            raise ValueError(f"Unknown command: {command}")
+        return self.snapshot()
+
+    def wait_if_paused(self):
+        while not self.resume_event.wait(0.05):
+            if self.stop_event.is_set():
+                break
+
+    def take_checkpoint_request(self):
+        if self.checkpoint_event.is_set():
+            self.checkpoint_event.clear()
+            return True
+        return False
+
+def controlled_map(pool, fn, jobs, state, window):
+    pending = iter(enumerate(jobs))
+    in_flight = {}
+    exhausted = False
+    while True:
+        state.wait_if_paused()
+        if state.stop_event.is_set():
+            for future in [f for f in in_flight if f.cancel()]:
+                del in_flight[future]
+            exhausted = True
+        while not exhausted and len(in_flight) < window:
+            try:
+                index, args = next(pending)
+            except StopIteration:
+                exhausted = True
+                break
+            in_flight[pool.submit(fn, *args)] = index
+        if not in_flight:
+            return
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield in_flight.pop(future), future
+
+class ControlServer:
+    def __init__(self, state, host=CONTROL_HOST, port=CONTROL_PORT):
+        self.state = state
+        self.host = host
+        self.port = port
+        self.running = False
+        self.server = None
+        self.server_thread = None
+
+    def start(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if os.name == "nt":
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+        else:
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.server.bind((self.host, self.port))
+        except OSError:
+            self.server.close()
+            self.server = None
+            raise
+        self.port = self.server.getsockname()[1]
+        self.server.settimeout(1.0)
+        self.server.listen(5)
+        self.running = True
+        self.server_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self.server_thread.start()
+        logging.info(f"Control channel listening on {self.host}:{self.port}")
+        return self.port
+
+    def start_with_fallback(self):
+        try:
+            return self.start()
+        except OSError as e:
+            logging.warning(f"Control port {self.port} unavailable ({e}), using an ephemeral port")
+        self.port = 0
+        try:
+            return self.start()
+        except OSError as e:
+            logging.error(f"Failed to start control channel: {e}")
+            self.port = None
+            return None
+
+    def stop(self):
+        self.running = False
+
+    def _accept_loop(self):
+        try:
+            while self.running:
+                try:
+                    client, _ = self.server.accept()
+                except socket.timeout:
+                    continue
+                threading.Thread(target=self._serve_client, args=(client,), daemon=True).start()
+        except OSError as e:
+            logging.error(f"Control channel error: {e}")
+        finally:
+            self.server.close()
+
+    def _serve_client(self, client):
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client.settimeout(1.0)
+        buffer = b""
+        try:
+            while self.running:
+                try:
+                    chunk = client.recv(4096)
+                except socket.timeout:
+                    continue
+                if not chunk:
+                    break
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        client.sendall((json.dumps(self._execute(line)) + "\n").encode('utf-8'))
+            if buffer.strip():
+                client.sendall((json.dumps(self._execute(buffer)) + "\n").encode('utf-8'))
+        except OSError:
+            pass
+        finally:
+            client.close()
+
+    def _execute(self, line):
+        message_id = None
+        try:
+            message = json.loads(line.decode('utf-8'))
+            message_id = message.get("id")
+            command = message.get("command")
+            state = self.state.handle(command)
+            logging.info(f"Control command '{command}' received")
+            return {"id": message_id, "command": command, "ok": True, **state}
+        except (ValueError, AttributeError) as e:
+            return {"id": message_id, "ok": False, "error": str(e)}
+
+class ControlClient:
+    def __init__(self, host=CONTROL_HOST, port=CONTROL_PORT, timeout=2.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.buffer = b""
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    def send(self, command):
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.sock is None:
+                        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+                        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    self.next_id += 1
+                    self.sock.sendall((json.dumps({"id": self.next_id, "command": command}) + "\n").encode('utf-8'))
+                    return self._read_ack(self.next_id)
+                except OSError:
+                    self.close()
+                    if attempt:
+                        raise
+
+    def _read_ack(self, message_id):
+        while True:
+            while b"\n" in self.buffer:
+                line, self.buffer = self.buffer.split(b"\n", 1)
+                ack = json.loads(line.decode('utf-8'))
+                if ack.get("id") == message_id or not ack.get("ok", True):
+                    return ack
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("Control channel closed")
+            self.buffer += chunk
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.buffer = b""
+
+def send_command(command, host=CONTROL_HOST, port=CONTROL_PORT, timeout=2.0):
+    client = ControlClient(host, port, timeout)
+    try:
+        return client.send(command)
+    finally:
+        client.close()
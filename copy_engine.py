@@ -0,0 +1,222 @@
+import os
+import shutil
+import hashlib
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+PART_SUFFIX = ".imspart"
+CHUNK_SIZE = 1024 * 1024
+LINK_MODES = ("copy", "reflink", "hardlink")
+
+try:
+    import fcntl
+    FICLONE = 0x40049409
+except ImportError:
+    fcntl = None
+
+def file_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def same_filesystem(src, dst_dir):
+    try:
+        return os.stat(src).st_dev == os.stat(dst_dir).st_dev
+    except OSError:
+        return False
+
+def try_reflink(src, dst):
+    if fcntl is None:
+        return False
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        return False
+
+class CopyEngine:
+    def __init__(self, roots, workers=4, link_mode="reflink", verify_hash=False):
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode {link_mode}, expected one of {', '.join(LINK_MODES)}")
+        self.roots = [(os.path.abspath(src), os.path.abspath(dst)) for src, dst in roots]
+        self.workers = max(1, int(workers))
+        self.link_mode = link_mode
+        self.verify_hash = verify_hash
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        self.thread = None
+        self.started = None
+        self.finished = None
+        self.total_files = 0
+        self.total_bytes = 0
+        self.done_files = 0
+        self.done_bytes = 0
+        self.copied_bytes = 0
+        self.counts = {"copied": 0, "resumed": 0, "linked": 0, "skipped": 0, "failed": 0}
+        self.errors = []
+        self.current = ""
+
+    def start(self):
+        self.started = time.time()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def done(self):
+        return self.finished is not None
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = max((self.finished or time.time()) - (self.started or time.time()), 1e-6)
+            return {
+                "total_files": self.total_files,
+                "total_bytes": self.total_bytes,
+                "done_files": self.done_files,
+                "done_bytes": self.done_bytes,
+                "throughput": self.copied_bytes / elapsed,
+                "elapsed": elapsed,
+                "current": self.current,
+                "done": self.done,
+                "cancelled": self.cancelled,
+                "errors": list(self.errors),
+                **self.counts
+            }
+
+    def plan(self):
+        files = []
+        for src_root, dst_root in self.roots:
+            if not os.path.isdir(src_root):
+                continue
+            for root, dirs, names in os.walk(src_root):
+                dirs.sort()
+                for name in sorted(names):
+                    if name.endswith(PART_SUFFIX):
+                        continue
+                    src = os.path.join(root, name)
+                    dst = os.path.join(dst_root, os.path.relpath(src, src_root))
+                    if os.path.abspath(src) == os.path.abspath(dst):
+                        continue
+                    try:
+                        files.append((src, dst, os.path.getsize(src)))
+                    except OSError:
+                        continue
+        return files
+
+    def _run(self):
+        try:
+            files = self.plan()
+            with self.lock:
+                self.total_files = len(files)
+                self.total_bytes = sum(size for _, _, size in files)
+            logging.info(f"Copy engine: {len(files)} files, {self.total_bytes / 1e6:.1f} MB, "
+                         f"{self.workers} workers, link mode {self.link_mode}")
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for _ in pool.map(self._copy_one, files):
+                    pass
+        except Exception as e:
+            logging.exception("Copy engine failed")
+            with self.lock:
+                self.errors.append(str(e))
+        finally:
+            with self.lock:
+                self.finished = time.time()
+            summary = ", ".join(f"{count} {name}" for name, count in self.counts.items() if count)
+            logging.info(f"Copy engine {'cancelled' if self.cancelled else 'finished'} in "
+                         f"{self.finished - self.started:.1f}s ({summary or 'nothing to do'})")
+
+    def _copy_one(self, item):
+        src, dst, size = item
+        if self.cancel_event.is_set():
+            return
+        with self.lock:
+            self.current = src
+        try:
+            result, copied = self._transfer(src, dst, size)
+        except Exception as e:
+            result, copied = "failed", 0
+            logging.error(f"Failed to copy {src} to {dst}: {e}")
+            with self.lock:
+                self.errors.append(f"{src}: {e}")
+        if result is None:
+            return
+        with self.lock:
+            self.counts[result] += 1
+            self.done_files += 1
+            self.done_bytes += size
+            self.copied_bytes += copied
+
+    def _is_current(self, src, dst, size):
+        try:
+            src_stat = os.stat(src)
+            dst_stat = os.stat(dst)
+        except OSError:
+            return False
+        if dst_stat.st_size != size:
+            return False
+        if int(dst_stat.st_mtime) == int(src_stat.st_mtime):
+            return True
+        if self.verify_hash and file_hash(src) == file_hash(dst):
+            shutil.copystat(src, dst)
+            return True
+        return False
+
+    def _transfer(self, src, dst, size):
+        if self._is_current(src, dst, size):
+            return "skipped", 0
+        dst_dir = os.path.dirname(dst)
+        os.makedirs(dst_dir, exist_ok=True)
+        part = dst + PART_SUFFIX
+        # A partial copy from an interrupted run is resumed below; linking would truncate or delete it
+        if self.link_mode != "copy" and not os.path.exists(part) and same_filesystem(src, dst_dir):
+            if self.link_mode == "hardlink":
+                try:
+                    os.link(src, part)
+                    os.replace(part, dst)
+                    return "linked", 0
+                except OSError:
+                    self._remove(part)
+            elif try_reflink(src, part):
+                shutil.copystat(src, part)
+                os.replace(part, dst)
+                return "linked", 0
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if offset > size or (offset and os.path.getmtime(part) < os.path.getmtime(src)):
+            offset = 0
+        with open(src, "rb") as s, open(part, "r+b" if offset else "wb") as d:
+            s.seek(offset)
+            d.seek(offset)
+            while True:
+                if self.cancel_event.is_set():
+                    return None, 0
+                chunk = s.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                d.write(chunk)
+            d.truncate()
+        if os.path.getsize(part) != size:
+            raise IOError(f"size mismatch after copy ({os.path.getsize(part)} != {size} bytes)")
+        shutil.copystat(src, part)
+        os.replace(part, dst)
+        return ("resumed" if offset else "copied"), size - offset
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
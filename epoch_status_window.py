@@ -1,25 +1,49 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import socket
 import threading
-import json
-import os
+import queue
+from status_channel import serve_status
+from control_channel import ControlClient
+from metric_history import MetricHistory
+
+REFRESH_INTERVAL_MS = 100
+CHART_SERIES = (
+    ("Loss", (("batch_loss", "#9bbbe0", False), ("epoch_loss", "#1f5fa8", True), ("epoch_val_loss", "#d9822b", True))),
+    ("Accuracy", (("batch_accuracy", "#9bbbe0", False), ("epoch_accuracy", "#1f5fa8", True), ("epoch_val_accuracy", "#d9822b", True)))
+)
 
 class EpochStatusWindow:
     def __init__(self):
         self.root = tk.Tk()
-        self.root.title("Training Progress")
-        self.root.geometry("500x500")
+        self.root.title("IMS Job Monitor")
+        self.root.geometry("560x960")
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.setup_ui()
-        self.server_thread = threading.Thread(target=self.start_server, daemon=True)
-        self.server_thread.start()
         self.is_running = True
         self.can_interrupt = False
+        self.jobs = {}
+        self.selected_job = None
+        self.controls = {}
+        self.updates = queue.Queue()
+        self.root.after(REFRESH_INTERVAL_MS, self.process_updates)
+        self.server_thread = threading.Thread(target=self.start_server, daemon=True)
+        self.server_thread.start()
     def setup_ui(self):
         main_frame = ttk.Frame(self.root, padding="10")
         main_frame.pack(fill=tk.BOTH, expand=True)
-        ttk.Label(main_frame, text="Training Progress", font=("Helvetica", 14, "bold")).pack(pady=10)
+        ttk.Label(main_frame, text="Job Monitor", font=("Helvetica", 14, "bold")).pack(pady=10)
+        jobs_frame = ttk.LabelFrame(main_frame, text="Jobs", padding="5")
+        jobs_frame.pack(fill=tk.X, pady=5)
+        columns = ("state", "progress", "throughput", "eta")
+        self.jobs_tree = ttk.Treeview(jobs_frame, columns=columns, height=4)
+        self.jobs_tree.heading("#0", text="Job")
+        self.jobs_tree.column("#0", width=170)
+        for column, width in zip(columns, (90, 70, 110, 80)):
+            self.jobs_tree.heading(column, text=column.capitalize())
+            self.jobs_tree.column(column, width=width, anchor=tk.CENTER)
+        self.jobs_tree.pack(fill=tk.X)
+        self.jobs_tree.bind("<<TreeviewSelect>>", self.on_job_selected)
+        ttk.Button(jobs_frame, text="Clear Finished", command=self.clear_finished_jobs).pack(anchor=tk.E, pady=2)
         system_frame = ttk.LabelFrame(main_frame, text="System Information", padding="10")
         system_frame.pack(fill=tk.X, pady=10)
         ttk.Label(system_frame, text="Python Version:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
@@ -46,13 +70,21 @@ class EpochStatusWindow:
         ttk.Label(status_frame, text="Accuracy:").grid(row=3, column=0, sticky=tk.W, padx=5, pady=5)
         self.acc_var = tk.StringVar(value="0.0")
         ttk.Label(status_frame, textvariable=self.acc_var).grid(row=3, column=1, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(status_frame, text="ETA:").grid(row=4, column=0, sticky=tk.W, padx=5, pady=5)
+        self.eta_var = tk.StringVar(value="N/A")
+        ttk.Label(status_frame, textvariable=self.eta_var).grid(row=4, column=1, sticky=tk.W, padx=5, pady=5)
+        chart_frame = ttk.LabelFrame(main_frame, text="Training Curves (light: batches, blue: train, orange: validation)", padding="5")
+        chart_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+        self.chart_canvas = tk.Canvas(chart_frame, height=240, bg="white", highlightthickness=0)
+        self.chart_canvas.pack(fill=tk.BOTH, expand=True)
+        self.chart_canvas.bind("<Configure>", lambda event: self.draw_charts())
         self.message_var = tk.StringVar()
         ttk.Label(main_frame, textvariable=self.message_var).pack(pady=5)
         stop_frame = ttk.Frame(main_frame)
         stop_frame.pack(fill=tk.X, pady=10)
         self.stop_button = tk.Button(
             stop_frame,
-            text="STOP TRAINING",
+            text="STOP SELECTED JOB",
             command=self.stop_training,
             bg="red",
             fg="white",
@@ -61,6 +93,12 @@ class EpochStatusWindow:
             state=tk.NORMAL
         )
         self.stop_button.pack(fill=tk.X, padx=20, pady=10)
+        control_frame = ttk.Frame(stop_frame)
+        control_frame.pack(fill=tk.X, padx=20)
+        self.pause_button = ttk.Button(control_frame, text="Pause", command=self.toggle_pause)
+        self.pause_button.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=5)
+        self.checkpoint_button = ttk.Button(control_frame, text="Checkpoint Now", command=self.request_checkpoint)
+        self.checkpoint_button.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=5)
         self.interrupt_status_var = tk.StringVar(value="")
         self.interrupt_status = ttk.Label(
             main_frame,
@@ -69,98 +107,230 @@ class EpochStatusWindow:
             font=("Helvetica", 10, "bold")
         )
         self.interrupt_status.pack(pady=5)
+        self.set_stop_enabled(False)
+        self.set_controls_enabled(False)
     def start_server(self):
-        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        server.bind(("127.0.0.1", 5678))
-        server.settimeout(1.0)
-        server.listen(5)
-        while self.is_running:
-            try:
-                client, _ = server.accept()
-                data = b""
-                while True:
-                    chunk = client.recv(4096)
-                    if not chunk:
-                        break
-                    data += chunk
-                try:
-                    message = json.loads(data.decode('utf-8'))
-                    self.update_ui(message)
-                except json.JSONDecodeError:
-                    pass
-                finally:
-                    client.close()
-            except socket.timeout:
+        try:
+            serve_status(self.updates.put, lambda: self.is_running)
+        except Exception as e:
+            print(f"Server error: {e}")
+    def process_updates(self):
+        if not self.is_running:
+            return
+        changed = set()
+        try:
+            while True:
+                data = self.updates.get_nowait()
+                job_id = data.get("job_id", "default")
+                if job_id not in self.jobs:
+                    self.jobs[job_id] = {"state": {}, "history": MetricHistory(), "dirty": False}
+                self.record_metrics(self.jobs[job_id], data)
+                self.jobs[job_id]["state"].update(data)
+                changed.add(job_id)
+        except queue.Empty:
+            pass
+        for job_id in changed:
+            self.refresh_job_row(job_id)
+        if self.selected_job is None and changed:
+            self.jobs_tree.selection_set(sorted(changed)[0])
+        elif self.selected_job in changed:
+            self.update_ui(self.jobs[self.selected_job]["state"])
+            if self.jobs[self.selected_job]["dirty"]:
+                self.draw_charts()
+        self.root.after(REFRESH_INTERVAL_MS, self.process_updates)
+    def refresh_job_row(self, job_id):
+        state = self.jobs[job_id]["state"]
+        throughput = state.get("throughput")
+        values = (
+            state.get("state", "running"),
+            f"{state.get('progress', 0)}%",
+            f"{throughput:.1f} {state.get('throughput_unit', '')}" if throughput is not None else "-",
+            self.format_eta(state.get("eta_seconds")) if "eta_seconds" in state else "-"
+        )
+        label = f"{state.get('job_name', 'job')} ({job_id})"
+        if self.jobs_tree.exists(job_id):
+            self.jobs_tree.item(job_id, text=label, values=values)
+        else:
+            self.jobs_tree.insert("", tk.END, iid=job_id, text=label, values=values)
+    def on_job_selected(self, event=None):
+        selection = self.jobs_tree.selection()
+        if not selection or selection[0] == self.selected_job:
+            return
+        self.selected_job = selection[0]
+        for var in (self.python_var, self.tf_var, self.gpu_var, self.eta_var):
+            var.set("N/A")
+        self.epoch_var.set("0/0")
+        self.progress_var.set(0)
+        self.loss_var.set("0.0")
+        self.acc_var.set("0.0")
+        self.message_var.set("")
+        self.interrupt_status_var.set("")
+        self.pause_button.config(text="Pause")
+        self.can_interrupt = False
+        self.set_stop_enabled(False)
+        self.set_controls_enabled(False)
+        self.update_ui(self.jobs[self.selected_job]["state"])
+        self.draw_charts()
+    def clear_finished_jobs(self):
+        for job_id in list(self.jobs):
+            if self.jobs[job_id]["state"].get("state") in ("finished", "interrupted", "failed"):
+                del self.jobs[job_id]
+                self.jobs_tree.delete(job_id)
+                if job_id == self.selected_job:
+                    self.selected_job = None
+    def record_metrics(self, job, data):
+        if data.get("epoch") == 0 and data.get("progress") == 0:
+            job["history"] = MetricHistory()
+            job["dirty"] = True
+        if "batch" in data and data.get("total_batches"):
+            x = data["epoch"] - 1 + data["batch"] / data["total_batches"]
+            job["history"].record("batch_loss", x, data.get("loss"))
+            job["history"].record("batch_accuracy", x, data.get("accuracy"))
+            job["dirty"] = True
+        elif "val_loss" in data:
+            for name in ("loss", "accuracy", "val_loss", "val_accuracy"):
+                job["history"].record(f"epoch_{name}", data["epoch"], data.get(name))
+            job["dirty"] = True
+    def draw_charts(self):
+        canvas = self.chart_canvas
+        canvas.delete("all")
+        if self.selected_job not in self.jobs:
+            return
+        job = self.jobs[self.selected_job]
+        job["dirty"] = False
+        history = job["history"]
+        width = canvas.winfo_width()
+        chart_height = canvas.winfo_height() / len(CHART_SERIES)
+        for i, (title, series) in enumerate(CHART_SERIES):
+            top = i * chart_height + 15
+            bottom = (i + 1) * chart_height - 15
+            left, right = 45, width - 10
+            canvas.create_text(left, top - 8, text=title, anchor=tk.W, font=("Helvetica", 9, "bold"))
+            canvas.create_rectangle(left, top, right, bottom, outline="gray80")
+            points = {name: history.get(name) for name, _, _ in series}
+            values = [v for pts in points.values() for _, v in pts]
+            if not values:
                 continue
-            except Exception as e:
-                print(f"Server error: {e}")
-                break
-        server.close()
+            max_x = max(x for pts in points.values() for x, _ in pts) or 1
+            low, high = min(values), max(values)
+            if high - low < 1e-9:
+                high = low + 1
+            canvas.create_text(left - 4, top, text=f"{high:.2f}", anchor=tk.E, font=("Helvetica", 8))
+            canvas.create_text(left - 4, bottom, text=f"{low:.2f}", anchor=tk.E, font=("Helvetica", 8))
+            for name, color, markers in series:
+                coords = []
+                for x, v in points[name]:
+                    coords.extend((left + x / max_x * (right - left), bottom - (v - low) / (high - low) * (bottom - top)))
+                if len(coords) >= 4:
+                    canvas.create_line(*coords, fill=color, width=2 if markers else 1)
+                if markers:
+                    for px, py in zip(coords[::2], coords[1::2]):
+                        canvas.create_oval(px - 2, py - 2, px + 2, py + 2, fill=color, outline=color)
+    def set_if_changed(self, var, value):
+        if var.get() != value:
+            var.set(value)
+    def set_stop_enabled(self, enabled):
+        state = tk.NORMAL if enabled else tk.DISABLED
+        if str(self.stop_button.cget("state")) == state:
+            return
+        if enabled:
+            self.stop_button.config(state=tk.NORMAL, bg="red", fg="white")
+        else:
+            self.stop_button.config(state=tk.DISABLED, bg="gray75", fg="gray25")
+    def set_controls_enabled(self, enabled):
+        state = tk.NORMAL if enabled else tk.DISABLED
+        for button in (self.pause_button, self.checkpoint_button):
+            if str(button.cget("state")) != state:
+                button.config(state=state)
     def update_ui(self, data):
+        controllable = data.get("control_port") is not None and data.get("state", "running") == "running"
         if "python_version" in data:
-            self.python_var.set(data["python_version"])
+            self.set_if_changed(self.python_var, data["python_version"])
         if "tensorflow_version" in data:
-            self.tf_var.set(data["tensorflow_version"])
+            self.set_if_changed(self.tf_var, data["tensorflow_version"])
         if "gpu_info" in data:
-            self.gpu_var.set(data["gpu_info"])
+            self.set_if_changed(self.gpu_var, data["gpu_info"])
         if "epoch" in data and "total_epochs" in data:
-            self.epoch_var.set(f"{data['epoch']}/{data['total_epochs']}")
-            if data['epoch'] > 0 and data['epoch'] <= data['total_epochs']:
+            self.set_if_changed(self.epoch_var, f"{data['epoch']}/{data['total_epochs']}")
+            if controllable and data['epoch'] > 0 and data['epoch'] <= data['total_epochs']:
                 self.can_interrupt = True
-                self.stop_button.config(state=tk.NORMAL, bg="red", fg="white")
-                self.interrupt_status_var.set("You can stop training if needed")
+                self.set_stop_enabled(True)
+                self.set_if_changed(self.interrupt_status_var, "You can stop training if needed")
         if "progress" in data:
-            self.progress_var.set(data["progress"])
+            self.set_if_changed(self.progress_var, data["progress"])
         if "loss" in data:
-            self.loss_var.set(f"{data['loss']:.4f}")
+            self.set_if_changed(self.loss_var, f"{data['loss']:.4f}")
         if "accuracy" in data:
-            self.acc_var.set(f"{data['accuracy']:.2%}")
+            self.set_if_changed(self.acc_var, f"{data['accuracy']:.2%}")
+        if "eta_seconds" in data:
+            self.set_if_changed(self.eta_var, self.format_eta(data["eta_seconds"]))
         if "message" in data:
-            self.message_var.set(data["message"])
+            self.set_if_changed(self.message_var, data["message"])
         if "can_interrupt" in data:
-            self.can_interrupt = data["can_interrupt"]
+            self.can_interrupt = controllable and data["can_interrupt"]
             if self.can_interrupt:
-                self.stop_button.config(state=tk.NORMAL, bg="red", fg="white")
+                self.set_stop_enabled(True)
             else:
-                self.stop_button.config(state=tk.DISABLED, bg="gray75", fg="gray25")
+                self.set_stop_enabled(False)
         if "interrupted" in data and data["interrupted"]:
-            self.interrupt_status_var.set("Training was interrupted. Using previously saved model.")
-            self.stop_button.config(state=tk.DISABLED, bg="gray75", fg="gray25")
+            self.set_if_changed(self.interrupt_status_var, "Training was interrupted. Using previously saved model.")
+            self.set_stop_enabled(False)
+        if not controllable:
+            self.can_interrupt = False
+            self.set_stop_enabled(False)
+        self.set_controls_enabled(controllable)
+    def format_eta(self, seconds):
+        if seconds is None:
+            return "Estimating..."
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        if hours:
+            return f"{hours}h {minutes:02d}m {seconds:02d}s"
+        return f"{minutes}m {seconds:02d}s"
+    def send_control(self, command):
+        state = self.jobs.get(self.selected_job, {}).get("state", {})
+        port = state.get("control_port")
+        if port is None:
+            messagebox.showerror("Error", f"The selected job does not accept {command} commands")
+            return None
+        if port not in self.controls:
+            self.controls[port] = ControlClient(port=port)
+        try:
+            ack = self.controls[port].send(command)
+        except Exception as e:
+            print(f"Failed to send {command} command: {e}")
+            messagebox.showerror("Error", f"Failed to send {command} command: training is not reachable")
+            return None
+        if not ack.get("ok"):
+            messagebox.showerror("Error", f"Command {command} rejected: {ack.get('error')}")
+            return None
+        self.pause_button.config(text="Resume" if ack.get("paused") else "Pause")
+        return ack
     def stop_training(self):
         if not self.can_interrupt:
             self.interrupt_status_var.set("No active training session to stop")
             return
-        confirm = messagebox.askyesno(
-            "Confirm Stop Training",
-            "Are you sure you want to stop the training? The system will use the previously saved model."
-        )
-        if confirm:
-            try:
-                client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                client.settimeout(2.0)
-                client.connect(("127.0.0.1", 5679))
-                client.sendall(json.dumps({"command": "stop"}).encode('utf-8'))
-                client.close()
-                self.interrupt_status_var.set("Stopping training... Please wait")
-                self.stop_button.config(state=tk.DISABLED, bg="gray75", fg="gray25")
-                self.can_interrupt = False
-            except Exception as e:
-                print(f"Failed to send stop command via socket: {e}")
-                try:
-                    import os
-                    current_dir = os.path.dirname(os.path.abspath(__file__))
-                    signal_file = os.path.join(current_dir, "stop_training.signal")
-                    with open(signal_file, "w") as f:
-                        f.write("stop")
-                    self.interrupt_status_var.set("Stop signal sent via file")
-                    self.stop_button.config(state=tk.DISABLED, bg="gray75", fg="gray25")
-                    self.can_interrupt = False
-                except Exception as e:
-                    print(f"Failed to create signal file: {e}")
-                    messagebox.showerror("Error", "Failed to send stop command")
+        job_name = self.jobs[self.selected_job]["state"].get("job_name", "job")
+        if job_name in ("train", "distill"):
+            prompt = "Are you sure you want to stop the training? The system will use the previously saved model."
+        else:
+            prompt = f"Are you sure you want to stop {job_name}? Work already finished is kept."
+        confirm = messagebox.askyesno("Confirm Stop", prompt)
+        if confirm and self.send_control("stop"):
+            self.interrupt_status_var.set(f"Stopping {job_name}... Please wait")
+            self.set_stop_enabled(False)
+            self.can_interrupt = False
+    def toggle_pause(self):
+        paused = self.pause_button.cget("text") == "Resume"
+        if self.send_control("resume" if paused else "pause"):
+            self.interrupt_status_var.set("" if paused else "Paused")
+    def request_checkpoint(self):
+        if self.send_control("checkpoint"):
+            self.interrupt_status_var.set("Checkpoint requested, saving after current batch")
     def on_close(self):
         self.is_running = False
+        for control in self.controls.values():
+            control.close()
         self.root.destroy()
 
 if __name__ == "__main__":
@@ -6,18 +6,28 @@ from tensorflow.keras.preprocessing.image import img_to_array
 import os
 import pandas as pd
 import datetime
+import time
 from collections import Counter
 from openpyxl import Workbook, load_workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
 import logging
-
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+from ims_logging import setup_logging
+from ims_trace import span, record_span
+import json
+from capture_common import letterbox, open_capture, CAPTURE_MODE
 
 root_dir = os.environ.get("IMS_INSTALLATION_DIR", os.path.dirname(os.path.abspath(__file__)))
+setup_logging(root_dir, "test", logging.DEBUG)
 models_dir = os.environ.get("IMS_MODELS_DIR", os.path.join(root_dir, "models"))
 
 model_path = os.path.join(models_dir, "model.h5")
 labels_path = os.path.join(models_dir, "labels1.txt")
+preprocessing_path = os.path.join(models_dir, "preprocessing.json")
+fast_model_path = os.environ.get("IMS_FAST_MODEL", os.path.join(models_dir, "student", "model.h5"))
+fast_labels_path = os.path.join(os.path.dirname(fast_model_path), "labels1.txt")
+cascade_enabled = os.environ.get("IMS_CASCADE", "0") == "1"
+cascade_threshold = float(os.environ.get("IMS_CASCADE_THRESHOLD", 90))
+cascade_margin = float(os.environ.get("IMS_CASCADE_MARGIN", 20))
 
 logging.info(f"Root directory: {root_dir}")
 logging.info(f"Models directory: {models_dir}")
@@ -49,7 +59,8 @@ try:
     if not os.path.exists(model_path):
         logging.error(f"Model file not found: {model_path}")
         raise FileNotFoundError(f"Model file not found: {model_path}")
-    model = load_model(model_path)
+    with span("model_load", path=model_path):
+        model = load_model(model_path)
     logging.info(f"Model loaded successfully from: {model_path}")
 except Exception as e:
     logging.error(f"Failed to load model: {e}")
@@ -70,11 +81,61 @@ except Exception as e:
     logging.error(f"Failed to load class names: {e}")
     raise
 
+try:
+    with open(preprocessing_path, "r") as f:
+        preprocessing_mode = json.load(f)["mode"]
+    logging.info(f"Using {preprocessing_mode} preprocessing recorded at training time")
+except (OSError, ValueError, KeyError) as e:
+    preprocessing_mode = "letterbox" if CAPTURE_MODE != "full" else "resize"
+    logging.warning(f"No preprocessing recorded in {preprocessing_path} ({e}), assuming {preprocessing_mode} "
+                    f"from the current capture mode; retrain to record it")
+
+fast_model = None
+if cascade_enabled:
+    try:
+        fast_class_names = {}
+        with open(fast_labels_path, "r") as f:
+            for line in f:
+                if ": " in line:
+                    index, name = line.strip().split(": ", 1)
+                    fast_class_names[int(index)] = name
+        if fast_class_names != class_names:
+            raise ValueError(f"labels in {fast_labels_path} do not match {labels_path}")
+        with span("model_load", path=fast_model_path):
+            fast_model = load_model(fast_model_path)
+        logging.info(f"Cascade enabled: fast model {fast_model_path}, threshold {cascade_threshold}%, margin {cascade_margin}%")
+    except Exception as e:
+        logging.warning(f"Cascade disabled, failed to load fast model: {e}")
+
+cascade_stats = {"frames": 0, "escalated": 0, "seconds": 0.0}
+
+def classify(image_array):
+    start = time.perf_counter()
+    if fast_model is None:
+        prediction = model.predict(image_array, verbose=0)[0]
+        escalated = True
+    else:
+        prediction = fast_model.predict_on_batch(image_array)[0]
+        top2 = np.sort(prediction)[-2:] * 100
+        escalated = top2[-1] < cascade_threshold or (len(top2) > 1 and top2[-1] - top2[0] < cascade_margin)
+        if escalated:
+            prediction = model.predict_on_batch(image_array)[0]
+    cascade_stats["frames"] += 1
+    cascade_stats["escalated"] += int(escalated)
+    cascade_stats["seconds"] += time.perf_counter() - start
+    return prediction
+
+def cascade_report():
+    frames = max(cascade_stats["frames"], 1)
+    return (f"escalated {cascade_stats['escalated'] / frames:.1%} of {cascade_stats['frames']} frames, "
+            f"{cascade_stats['seconds'] / frames * 1000:.1f} ms/frame")
+
 def save_to_excel():
     if not detected_objects:
         logging.warning("No detected objects to save")
         return
     logging.info(f"Saving {len(detected_objects)} detected objects to Excel")
+    excel_span = span("excel_save", rows=len(detected_objects))
     try:
         df = pd.DataFrame(detected_objects, columns=["Timestamp", "Object", "Confidence"])
         logging.debug(f"Created DataFrame with {len(df)} rows")
@@ -117,7 +178,9 @@ def save_to_excel():
         else:
             logging.info(f"Creating new Excel file: {today_excel}")
             create_new_excel_file(df)
+        excel_span.end()
     except Exception as e:
+        excel_span.end(ok=False, error=str(e))
         logging.error(f"Failed to save to Excel: {e}")
         print(f"Error saving to Excel: {e}")
 
@@ -144,7 +207,7 @@ def create_new_excel_file(df):
         print(f"Error creating Excel file: {e}")
 
 try:
-    cap = cv2.VideoCapture(0)
+    cap = open_capture(0)
     if not cap.isOpened():
         logging.error("Failed to open camera")
         raise RuntimeError("Failed to open camera")
@@ -156,18 +219,19 @@ except Exception as e:
 cv2.namedWindow("IMS Feed", cv2.WINDOW_NORMAL)
 
 logging.info("Starting Excel feed detection loop")
+feed_start = time.time()
 
 while True:
     ret, frame = cap.read()
     if not ret:
         logging.warning("Failed to read frame from camera")
         break
-    image_resized = cv2.resize(frame, (224, 224))
+    image_resized = letterbox(frame) if preprocessing_mode == "letterbox" else cv2.resize(frame, (224, 224))
     image_array = img_to_array(image_resized)
     image_array = np.expand_dims(image_array, axis=0)
     image_array /= 255.0
     try:
-        prediction = model.predict(image_array, verbose=0)
+        prediction = classify(image_array)
         predicted_class = np.argmax(prediction)
         confidence = np.max(prediction) * 100
         class_label = class_names.get(predicted_class, "Unknown")
@@ -176,6 +240,9 @@ while True:
                     cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
         cv2.putText(frame, f"Confidence: {confidence:.2f}%", (10, 70),
                     cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+        if fast_model is not None:
+            cv2.putText(frame, f"Cascade: {cascade_report()}", (10, 100),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
         current_time = datetime.datetime.now()
         if registration_message and registration_time:
             elapsed_time = (current_time - registration_time).total_seconds()
@@ -237,6 +304,11 @@ try:
 except Exception as e:
     logging.error(f"Final save failed: {e}")
 
+if fast_model is not None:
+    logging.info(f"Cascade summary: {cascade_report()}")
+record_span("inference", feed_start, cascade_stats["seconds"], frames=cascade_stats["frames"],
+            escalated=cascade_stats["escalated"], feed_seconds=round(time.time() - feed_start, 3))
+
 cap.release()
 cv2.destroyAllWindows()
 logging.info("Application closed")
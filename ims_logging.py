@@ -0,0 +1,173 @@
+import os
+import re
+import sys
+import json
+import socket
+import threading
+import logging
+from logging.handlers import RotatingFileHandler
+
+LOG_FILE_NAME = "ims_debug.log"
+LOG_FORMAT = "%(asctime)s - %(levelname)s - [%(stage)s] %(message)s"
+LOG_MAX_BYTES = int(os.environ.get("IMS_LOG_MAX_BYTES", 5 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get("IMS_LOG_BACKUP_COUNT", 5))
+LOG_HOST = "127.0.0.1"
+LINE_RE = re.compile(r"^\S+ \S+ - (\w+) - (?:\[(\w+)\] )?(.*)$")
+
+class StageFilter(logging.Filter):
+    def __init__(self, stage):
+        super().__init__()
+        self.stage = stage
+
+    def filter(self, record):
+        if not hasattr(record, "stage"):
+            record.stage = self.stage
+        return True
+
+class SafeRotatingFileHandler(RotatingFileHandler):
+    def doRollover(self):
+        try:
+            super().doRollover()
+        except OSError:
+            if self.stream is None:
+                self.stream = self._open()
+
+class SocketLogHandler(logging.Handler):
+    def __init__(self, sock):
+        super().__init__()
+        self.sock = sock
+
+    def emit(self, record):
+        try:
+            data = {
+                "name": record.name,
+                "levelno": record.levelno,
+                "levelname": record.levelname,
+                "msg": record.getMessage(),
+                "created": record.created,
+                "stage": record.stage,
+                "exc_text": logging.Formatter().formatException(record.exc_info) if record.exc_info else record.exc_text
+            }
+            self.sock.sendall((json.dumps(data, default=str) + "\n").encode("utf-8"))
+        except Exception:
+            # The launcher pumps stderr into the log, so nothing is lost if its socket goes away
+            sys.stderr.write(logging.Formatter(LOG_FORMAT).format(record) + "\n")
+
+    def close(self):
+        try:
+            self.sock.close()
+        finally:
+            super().close()
+
+def connect_log_server(port, host=LOG_HOST):
+    try:
+        return SocketLogHandler(socket.create_connection((host, port), timeout=2))
+    except OSError:
+        return None
+
+def serve_logs(handler, host=LOG_HOST, port=0):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind((host, port))
+    server.listen(8)
+
+    def receive(client):
+        with client, client.makefile("rb") as stream:
+            for line in stream:
+                try:
+                    data = json.loads(line.decode("utf-8"))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+                handler.handle(logging.makeLogRecord({**data, "args": None, "exc_info": None}))
+
+    def accept_loop():
+        while True:
+            try:
+                client, _ = server.accept()
+            except OSError:
+                return
+            threading.Thread(target=receive, args=(client,), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    return server.getsockname()[1]
+
+def log_path(root_dir):
+    return os.path.join(root_dir, LOG_FILE_NAME)
+
+def setup_logging(root_dir, stage, level=logging.INFO):
+    handler = None
+    if os.environ.get("IMS_LOG_PORT"):
+        handler = connect_log_server(int(os.environ["IMS_LOG_PORT"]))
+    if handler is None:
+        handler = SafeRotatingFileHandler(log_path(root_dir), maxBytes=LOG_MAX_BYTES,
+                                          backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(StageFilter(stage))
+    handler.ims_handler = True
+    logger = logging.getLogger()
+    for previous in [h for h in logger.handlers if getattr(h, "ims_handler", False)]:
+        logger.removeHandler(previous)
+        previous.close()
+    logger.setLevel(level)
+    logger.addHandler(handler)
+    return handler
+
+def log_files(path):
+    files = [path]
+    for index in range(1, LOG_BACKUP_COUNT + 1):
+        backup = f"{path}.{index}"
+        if not os.path.exists(backup):
+            break
+        files.append(backup)
+    return files
+
+def read_chunk_before(path, end, size):
+    start = max(0, end - size)
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    if start > 0 and b"\n" in data:
+        cut = data.index(b"\n") + 1
+        start += cut
+        data = data[cut:]
+    return start, data.decode("utf-8", "replace")
+
+def read_new(path, offset):
+    size = os.path.getsize(path)
+    if size < offset:
+        offset = 0
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(size - offset)
+    complete = data.rfind(b"\n") + 1
+    return offset + complete, data[:complete].decode("utf-8", "replace")
+
+def line_matches(line, text="", level="", stage=""):
+    if text and text.lower() not in line.lower():
+        return False
+    if level or stage:
+        match = LINE_RE.match(line)
+        if not match:
+            return False
+        if level and match.group(1) != level:
+            return False
+        if stage:
+            line_stage = (match.group(2) or "").lower()
+            output_label = match.group(3).split(" OUTPUT:", 1)[0].lower() if " OUTPUT:" in match.group(3) else ""
+            if stage.lower() not in (line_stage, output_label):
+                return False
+    return True
+
+def search_logs(path, text="", level="", stage="", limit=500, should_stop=lambda: False):
+    results = []
+    for file_path in log_files(path):
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if line_matches(line, text, level, stage):
+                    results.append((os.path.basename(file_path), line.rstrip("\n")))
+                    if len(results) >= limit:
+                        return results
+                if should_stop():
+                    return results
+    return results
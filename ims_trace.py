@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import datetime
+import threading
+import logging
+from collections import defaultdict
+
+TRACE_FILE_NAME = "ims_trace.jsonl"
+write_lock = threading.Lock()
+fallback_run_id = None
+
+def make_run_id():
+    return f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+def current_run_id():
+    global fallback_run_id
+    run_id = os.environ.get("IMS_RUN_ID")
+    if run_id:
+        return run_id
+    if fallback_run_id is None:
+        fallback_run_id = make_run_id()
+    return fallback_run_id
+
+def trace_path():
+    if os.environ.get("IMS_TRACE_FILE"):
+        return os.environ["IMS_TRACE_FILE"]
+    root_dir = os.environ.get("IMS_INSTALLATION_DIR", os.getcwd())
+    return os.path.join(root_dir, TRACE_FILE_NAME)
+
+def default_stage():
+    return os.environ.get("IMS_TRACE_STAGE") or os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+
+def record_span(name, start, duration, stage=None, ok=True, **attrs):
+    if os.environ.get("IMS_TRACE", "1") == "0":
+        return
+    record = {
+        "run_id": current_run_id(),
+        "stage": stage or default_stage(),
+        "name": name,
+        "start": round(start, 6),
+        "duration": round(duration, 6),
+        "pid": os.getpid(),
+        "ok": ok,
+        **attrs
+    }
+    try:
+        line = json.dumps(record, default=str) + "\n"
+        with write_lock:
+            with open(trace_path(), "a", encoding="utf-8") as f:
+                f.write(line)
+    except OSError as e:
+        logging.debug(f"Failed to write trace span {name}: {e}")
+
+class Span:
+    def __init__(self, name, stage=None, **attrs):
+        self.name = name
+        self.stage = stage
+        self.attrs = attrs
+        self.start = time.time()
+        self.perf_start = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, ok=True, **attrs):
+        if self.duration is not None:
+            return self.duration
+        self.attrs.update(attrs)
+        self.duration = time.perf_counter() - self.perf_start
+        record_span(self.name, self.start, self.duration, stage=self.stage, ok=ok, **self.attrs)
+        return self.duration
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.end()
+        else:
+            self.end(ok=False, error=f"{exc_type.__name__}: {exc}")
+        return False
+
+def span(name, stage=None, **attrs):
+    return Span(name, stage=stage, **attrs)
+
+def load_spans(path):
+    spans = []
+    if not os.path.exists(path):
+        return spans
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            try:
+                spans.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return spans
+
+def run_ids(spans):
+    first_seen = {}
+    for record in spans:
+        first_seen.setdefault(record.get("run_id"), record.get("start", 0))
+    return sorted(first_seen, key=first_seen.get)
+
+def format_report(spans, run_id=None):
+    if not spans:
+        return "No trace spans recorded."
+    run_id = run_id or run_ids(spans)[-1]
+    spans = [s for s in spans if run_id == "all" or s.get("run_id") == run_id]
+    if not spans:
+        return f"No trace spans for run {run_id}."
+    run_start = min(s["start"] for s in spans)
+    run_end = max(s["start"] + s["duration"] for s in spans)
+    wall = max(run_end - run_start, 1e-9)
+    stage_wall = {}
+    groups = defaultdict(list)
+    for s in spans:
+        start, end = stage_wall.get(s["stage"], (s["start"], s["start"] + s["duration"]))
+        stage_wall[s["stage"]] = (min(start, s["start"]), max(end, s["start"] + s["duration"]))
+        groups[(s["stage"], s["name"])].append(s)
+    lines = [
+        f"Run {run_id}: {len(spans)} spans, {wall:.1f}s wall time "
+        f"({datetime.datetime.fromtimestamp(run_start):%Y-%m-%d %H:%M:%S} - {datetime.datetime.fromtimestamp(run_end):%H:%M:%S})",
+        "",
+        f"{'stage':<16}{'span':<26}{'count':>6}{'total s':>10}{'mean s':>9}{'max s':>9}{'% wall':>8}{'failed':>7}"
+    ]
+    for (stage, name), items in sorted(groups.items(), key=lambda kv: -sum(s["duration"] for s in kv[1])):
+        durations = [s["duration"] for s in items]
+        total = sum(durations)
+        failed = sum(1 for s in items if not s.get("ok", True))
+        lines.append(f"{stage[:15]:<16}{name[:25]:<26}{len(items):>6}{total:>10.2f}{total / len(items):>9.3f}"
+                     f"{max(durations):>9.3f}{total / wall * 100:>7.1f}%{failed:>7}")
+    lines.append("")
+    lines.append("Stage wall time (first span start to last span end):")
+    for stage, (start, end) in sorted(stage_wall.items(), key=lambda kv: kv[1][0]):
+        lines.append(f"  {stage:<16}{end - start:>10.2f}s  starts at +{start - run_start:.1f}s")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="IMS trace tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report = subparsers.add_parser("report", help="Show where wall time went for a run")
+    report.add_argument("--file", default=trace_path(), help="Trace file (default: %(default)s)")
+    report.add_argument("--run", default=None, help="Run ID to report, 'all' for every run (default: latest)")
+    report.add_argument("--list", action="store_true", help="List recorded run IDs")
+    args = parser.parse_args()
+    spans = load_spans(args.file)
+    if args.list:
+        for run_id in run_ids(spans):
+            print(run_id)
+        return
+    print(format_report(spans, args.run))
+
+if __name__ == "__main__":
+    main()
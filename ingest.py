@@ -0,0 +1,224 @@
+import os
+import sys
+import shutil
+import argparse
+import cv2
+from concurrent.futures import ProcessPoolExecutor
+from capture_common import (FrameGate, CaptureLayout, CAPTURE_MODES, CAPTURE_MODE, BLUR_THRESHOLD, MIN_HASH_DISTANCE,
+                            GATE_HISTORY, JPEG_QUALITY, full_data_dir, get_next_image_index, gate_enabled)
+from status_channel import JobReporter
+from ims_trace import span
+from control_channel import ControlState, ControlServer, controlled_map
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+CHUNK_FRAMES = 200
+
+root_dir = os.environ.get("IMS_INSTALLATION_DIR", os.path.dirname(os.path.abspath(__file__)))
+
+def parse_crop(text):
+    if not text:
+        return None
+    try:
+        x1, y1, x2, y2 = (int(v) for v in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError("crop must be x1,y1,x2,y2")
+    if x1 == x2 or y1 == y2:
+        raise argparse.ArgumentTypeError("crop box must have a non-zero size")
+    return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+def list_images(folder):
+    images = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        images.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(IMAGE_EXTENSIONS))
+    return images
+
+def plan_tasks(sources, rate, chunk_frames=CHUNK_FRAMES):
+    tasks = []
+    for source in sources:
+        if os.path.isdir(source):
+            images = list_images(source)
+            for start in range(0, len(images), chunk_frames):
+                tasks.append({"kind": "images", "source": source, "paths": images[start:start + chunk_frames],
+                              "frames": len(images[start:start + chunk_frames])})
+        elif source.lower().endswith(VIDEO_EXTENSIONS):
+            cap = cv2.VideoCapture(source)
+            if not cap.isOpened():
+                raise ValueError(f"Cannot open video {source}")
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            video_fps = cap.get(cv2.CAP_PROP_FPS) or 30
+            cap.release()
+            step = max(1, round(video_fps / rate)) if rate > 0 else 1
+            span_frames = chunk_frames * step
+            for start in range(0, max(frame_count, 1), span_frames):
+                end = min(start + span_frames, frame_count) if frame_count > 0 else None
+                tasks.append({"kind": "video", "source": source, "start": start, "end": end, "step": step,
+                              "frames": len(range(start, end, step)) if end is not None else 0})
+        else:
+            raise ValueError(f"{source} is neither a folder nor a supported video ({', '.join(VIDEO_EXTENSIONS)})")
+    for chunk_id, task in enumerate(tasks):
+        task["chunk_id"] = chunk_id
+    return tasks
+
+def iter_task_frames(task):
+    if task["kind"] == "images":
+        for path in task["paths"]:
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield frame
+        return
+    cap = cv2.VideoCapture(task["source"])
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, task["start"])
+        position = task["start"]
+        while task["end"] is None or position < task["end"]:
+            if (position - task["start"]) % task["step"] == 0:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield frame
+            elif not cap.grab():
+                break
+            position += 1
+    finally:
+        cap.release()
+
+def process_task(task, settings):
+    cv2.setNumThreads(1)
+    staging = CaptureLayout(settings["staging_dir"], settings["mode"], settings["staging_full_dir"])
+    gate = FrameGate(settings["gate"], settings["blur_threshold"], settings["min_distance"], settings["history"])
+    crop = settings["crop"]
+    kept = []
+    decoded = 0
+    for frame in iter_task_frames(task):
+        decoded += 1
+        if crop is not None:
+            x1, y1, x2, y2 = crop
+            frame = frame[y1:y2, x1:x2]
+            if frame.size == 0:
+                continue
+        keep, _ = gate.check(frame)
+        if not keep:
+            continue
+        name = f"{task['chunk_id']:05d}_{len(kept):05d}.jpg"
+        for path, transform in staging.targets(name):
+            cv2.imwrite(path, transform(frame) if transform else frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        gate.commit()
+        kept.append((name, gate.last_hash))
+    return {"chunk_id": task["chunk_id"], "decoded": decoded, "kept": kept,
+            "blurry": gate.blurry, "redundant": gate.redundant}
+
+def move_file(src, dst):
+    try:
+        os.replace(src, dst)
+    except OSError:
+        shutil.move(src, dst)
+
+def ingest(object_name, sources, rate=5.0, crop=None, gate=True, blur_threshold=BLUR_THRESHOLD,
+           min_distance=MIN_HASH_DISTANCE, max_images=None, workers=None, mode=CAPTURE_MODE, data_dir=None):
+    data_dir = data_dir or os.environ.get("IMS_DATA_DIR", os.path.join(root_dir, "data"))
+    gate = gate and gate_enabled(object_name)
+    save_dir = os.path.join(data_dir, object_name)
+    full_dir = os.path.join(full_data_dir(data_dir), object_name)
+    staging_root = os.path.join(os.path.dirname(os.path.abspath(data_dir)), ".ims_ingest", f"{object_name}_{os.getpid()}")
+    settings = {
+        "mode": mode, "crop": crop, "gate": gate, "blur_threshold": blur_threshold, "min_distance": min_distance,
+        "history": GATE_HISTORY, "staging_dir": os.path.join(staging_root, "data"),
+        "staging_full_dir": os.path.join(staging_root, "full")
+    }
+    tasks = plan_tasks(sources, rate)
+    total_frames = sum(task["frames"] for task in tasks)
+    final = CaptureLayout(save_dir, mode, full_dir)
+    staging = CaptureLayout(settings["staging_dir"], mode, settings["staging_full_dir"])
+    next_index = get_next_image_index(save_dir, object_name)
+    parent_gate = FrameGate(gate, blur_threshold, min_distance, GATE_HISTORY)
+    control_state = ControlState()
+    control_server = ControlServer(control_state, port=0)
+    reporter = JobReporter("ingest", total=total_frames, unit="frames", control_port=control_server.start_with_fallback())
+    ingest_span = span("ingest", object=object_name, sources=len(sources), chunks=len(tasks))
+    results = {}
+    totals = {"decoded": 0, "blurry": 0, "redundant": 0, "saved": 0}
+    next_chunk = 0
+    limit_reached = False
+    print(f"Ingesting {len(sources)} source(s) into {save_dir}: {len(tasks)} chunks, ~{total_frames} sampled frames")
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            window = (workers or os.cpu_count() or 1) * 2
+            jobs = [(task, settings) for task in tasks]
+            for _, future in controlled_map(pool, process_task, jobs, control_state, window):
+                result = future.result()
+                results[result["chunk_id"]] = result
+                for key in ("decoded", "blurry", "redundant"):
+                    totals[key] += result[key]
+                while next_chunk in results:
+                    for name, frame_hash in results.pop(next_chunk)["kept"]:
+                        staged = staging.targets(name)
+                        full = max_images is not None and totals["saved"] >= max_images
+                        if full or (gate and not parent_gate.check_hash(frame_hash)):
+                            if not full:
+                                totals["redundant"] += 1
+                            for path, _ in staged:
+                                os.remove(path)
+                            continue
+                        filename = f"{object_name}_{next_index:03d}.jpg"
+                        for (src, _), (dst, _) in zip(staged, final.targets(filename)):
+                            move_file(src, dst)
+                        next_index += 1
+                        totals["saved"] += 1
+                    next_chunk += 1
+                if max_images is not None and totals["saved"] >= max_images and not control_state.stop_event.is_set():
+                    limit_reached = True
+                    control_state.stop_event.set()
+                reporter.update(totals["decoded"], f"Saved {totals['saved']} images ({totals['blurry']} blurry, "
+                                                   f"{totals['redundant']} redundant)")
+        stopped = control_state.stop_event.is_set() and not limit_reached
+        totals["stopped"] = stopped
+        reporter.finish(f"{'Stopped after saving' if stopped else 'Saved'} {totals['saved']} images of {object_name}",
+                        state="interrupted" if stopped else "finished")
+    except BaseException:
+        reporter.finish("Ingestion failed", state="failed")
+        raise
+    finally:
+        control_server.stop()
+        shutil.rmtree(staging_root, ignore_errors=True)
+        try:
+            os.rmdir(os.path.dirname(staging_root))
+        except OSError:
+            pass
+        ingest_span.end(**totals)
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest video files or image folders into data/<class>/ without a camera")
+    parser.add_argument("class_name", help="Object class to append images to")
+    parser.add_argument("sources", nargs="+", help="Video files and/or folders of images")
+    parser.add_argument("--rate", type=float, default=5.0, help="Frames sampled per second of video (default: %(default)s, 0 = every frame)")
+    parser.add_argument("--crop", type=parse_crop, default=None, help="Crop box x1,y1,x2,y2 applied to every frame")
+    parser.add_argument("--no-gate", action="store_true", help="Keep blurry and near-duplicate frames")
+    parser.add_argument("--blur-threshold", type=float, default=BLUR_THRESHOLD, help="Minimum Laplacian variance (default: %(default)s)")
+    parser.add_argument("--min-hash-distance", type=int, default=MIN_HASH_DISTANCE, help="Minimum dHash distance to recent frames (default: %(default)s)")
+    parser.add_argument("--max-images", type=int, default=None, help="Stop after saving this many images")
+    parser.add_argument("--workers", type=int, default=None, help="Decoder processes (default: CPU count)")
+    parser.add_argument("--mode", choices=CAPTURE_MODES, default=CAPTURE_MODE, help="Image layout, as for capture (default: %(default)s)")
+    parser.add_argument("--data-dir", default=None, help="Dataset root (default: IMS_DATA_DIR or <install>/data)")
+    args = parser.parse_args()
+    object_name = args.class_name.strip().lower().replace(" ", "_")
+    if not (0 < len(object_name) <= 20 and object_name.isalnum()):
+        parser.error("class name must be alphanumeric, 1-20 characters")
+    try:
+        totals = ingest(object_name, args.sources, rate=args.rate, crop=args.crop, gate=not args.no_gate,
+                        blur_threshold=args.blur_threshold, min_distance=args.min_hash_distance,
+                        max_images=args.max_images, workers=args.workers, mode=args.mode, data_dir=args.data_dir)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    print(f"Saved {totals['saved']} images of '{object_name}' ({totals['decoded']} frames decoded, "
+          f"{totals['blurry']} blurry, {totals['redundant']} redundant)")
+    if totals["stopped"]:
+        print("Ingestion was stopped before all sources were processed")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
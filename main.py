@@ -1,21 +1,34 @@
 import os
 import sys
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+from tkinter import ttk, filedialog, messagebox, simpledialog
 import subprocess
 import json
 import shutil
 import threading
 import logging
 import datetime
+from pipeline import Pipeline, Stage, DONE, FAILED, RUNNING
+from stage_worker import WorkerPool
+from process_runner import ProcessRunner
+from ims_logging import setup_logging, serve_logs, log_files, read_chunk_before, read_new, search_logs
+from ims_trace import make_run_id, load_spans, format_report, TRACE_FILE_NAME
+from copy_engine import CopyEngine, LINK_MODES
+from capture_common import CAPTURE_MODES, parse_camera_indices
 
-logging.basicConfig(filename="ims_debug.log", level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
+os.environ.pop("IMS_LOG_PORT", None)
+log_handler = setup_logging(os.getcwd(), "main", logging.DEBUG)
+os.environ["IMS_LOG_PORT"] = str(serve_logs(log_handler))
+LOG_PAGE_BYTES = 256 * 1024
+LOG_TAIL_INTERVAL_MS = 1000
+LOG_MAX_VIEW_LINES = 20000
+WORKFLOW_COMPRESS_MODES = ("compress", "target", "none")
 
 class IMSApplication:
     def __init__(self, root):
         self.root = root
         self.root.title("Inventory Management System (IMS)")
-        self.root.geometry("850x700")
+        self.root.geometry("850x860")
         self.root.resizable(True, True)
         self.python_executable = self.get_python_executable()
         self.default_dir = self.get_installation_directory()
@@ -25,6 +38,11 @@ class IMSApplication:
             return
         self.config_file = os.path.join(self.default_dir, "config.json")
         self.config = self.load_config()
+        os.environ["IMS_CONFIG_FILE"] = self.config_file
+        os.environ["IMS_TRACE_FILE"] = os.path.join(self.config["installation_dir"], TRACE_FILE_NAME)
+        os.environ["IMS_CAPTURE_MODE"] = self.config.get("capture_mode", "full")
+        os.environ["IMS_CAMERAS"] = self.config.get("cameras", "")
+        self.start_run()
         self.workflow_status = {
             "capture": False,
             "append": False,
@@ -32,7 +50,15 @@ class IMSApplication:
             "train": False,
             "test": False
         }
+        self.pipeline = None
+        self.worker_pool = None
+        self.copy_engine = None
+        self.copy_target = None
+        self.train_schedule = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.create_ui()
+        if self.config.get("pending_copy"):
+            self.root.after(500, self.resume_pending_copy)
     def get_python_executable(self):
         conda_prefix = os.environ.get('CONDA_PREFIX')
         if conda_prefix:
@@ -97,6 +123,11 @@ class IMSApplication:
         }
     def save_config(self):
         try:
+            if os.path.exists(self.config_file):
+                with open(self.config_file, "r") as f:
+                    on_disk = json.load(f)
+                if "camera" in on_disk:
+                    self.config["camera"] = on_disk["camera"]
             with open(self.config_file, "w") as f:
                 json.dump(self.config, f, indent=4)
         except Exception as e:
@@ -133,6 +164,13 @@ class IMSApplication:
             row=0, column=1, padx=5, pady=5)
         ttk.Button(dir_frame, text="Change", command=self.change_directory).grid(
             row=0, column=2, padx=5, pady=5)
+        self.copy_progress_var = tk.DoubleVar(value=0)
+        ttk.Progressbar(dir_frame, variable=self.copy_progress_var, maximum=100).grid(
+            row=1, column=0, columnspan=2, sticky=tk.EW, padx=5, pady=2)
+        self.cancel_copy_button = ttk.Button(dir_frame, text="Cancel Copy", command=self.cancel_copy, state=tk.DISABLED)
+        self.cancel_copy_button.grid(row=1, column=2, padx=5, pady=2)
+        self.copy_status_var = tk.StringVar(value="")
+        ttk.Label(dir_frame, textvariable=self.copy_status_var).grid(row=2, column=0, columnspan=3, sticky=tk.W, padx=5)
         workflow_frame = ttk.LabelFrame(self.main_tab, text="Workflow")
         workflow_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
         self.epoch_progress_var = tk.StringVar(value="Epoch Progress: 0%")
@@ -152,11 +190,23 @@ class IMSApplication:
         self.create_workflow_step(workflow_frame, 4, "5. Test Model",
                                  "Test the trained model in real-time",
                                  self.run_test_model)
+        pipeline_frame = ttk.LabelFrame(self.main_tab, text="Pipeline")
+        pipeline_frame.pack(fill=tk.X, padx=20, pady=5)
+        self.pipeline_tree = ttk.Treeview(pipeline_frame, columns=("state", "duration"), height=5)
+        self.pipeline_tree.heading("#0", text="Stage")
+        self.pipeline_tree.heading("state", text="State")
+        self.pipeline_tree.heading("duration", text="Duration")
+        self.pipeline_tree.column("state", width=120, anchor=tk.CENTER)
+        self.pipeline_tree.column("duration", width=120, anchor=tk.CENTER)
+        self.pipeline_tree.pack(fill=tk.X, padx=5, pady=5)
+        self.pipeline_status_var = tk.StringVar(value="No pipeline running")
+        ttk.Label(pipeline_frame, textvariable=self.pipeline_status_var).pack(anchor=tk.W, padx=5)
         bottom_frame = ttk.Frame(self.main_tab)
         bottom_frame.pack(fill=tk.X, padx=20, pady=10)
         ttk.Button(bottom_frame, text="Reset Workflow Status", command=self.reset_workflow).pack(side=tk.LEFT, padx=5)
         ttk.Button(bottom_frame, text="Run Complete Workflow", command=self.run_complete_workflow).pack(side=tk.LEFT, padx=5)
-        ttk.Button(bottom_frame, text="Show Epoch Status", command=self.show_epoch_status).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(bottom_frame, text="Cancel Workflow", command=self.cancel_workflow).pack(side=tk.LEFT, padx=5)
+        ttk.Button(bottom_frame, text="Show Job Monitor", command=self.show_epoch_status).pack(side=tk.RIGHT, padx=5)
     def create_workflow_step(self, parent, row, title, description, command):
         step_frame = ttk.Frame(parent)
         step_frame.grid(row=row+1, column=0, sticky=tk.W+tk.E, padx=10, pady=10)
@@ -191,7 +241,16 @@ class IMSApplication:
         ttk.Label(step_frame, text="Epochs:").pack(side=tk.LEFT, padx=5)
         self.epochs_var = tk.IntVar(value=10)
         ttk.Entry(step_frame, textvariable=self.epochs_var, width=5).pack(side=tk.LEFT, padx=5)
+        ttk.Label(step_frame, text="Budget (min):").pack(side=tk.LEFT, padx=5)
+        self.time_budget_var = tk.StringVar(value="")
+        ttk.Entry(step_frame, textvariable=self.time_budget_var, width=5).pack(side=tk.LEFT, padx=5)
+        ttk.Label(step_frame, text="Start at:").pack(side=tk.LEFT, padx=5)
+        self.train_start_var = tk.StringVar(value="")
+        ttk.Entry(step_frame, textvariable=self.train_start_var, width=6).pack(side=tk.LEFT, padx=5)
         ttk.Button(step_frame, text="Run", command=command).pack(side=tk.RIGHT, padx=10)
+        self.cancel_schedule_button = ttk.Button(step_frame, text="Cancel Schedule", command=self.cancel_train_schedule,
+                                                 state=tk.DISABLED)
+        self.cancel_schedule_button.pack(side=tk.RIGHT, padx=5)
     def build_settings_tab(self):
         settings_frame = ttk.Frame(self.settings_tab, padding=20)
         settings_frame.pack(fill=tk.BOTH, expand=True)
@@ -205,8 +264,53 @@ class IMSApplication:
         ttk.Entry(settings_frame, textvariable=self.models_dir_var, width=50).grid(row=1, column=1, padx=5, pady=5)
         ttk.Button(settings_frame, text="Browse",
                   command=lambda: self.browse_directory(self.models_dir_var)).grid(row=1, column=2, padx=5, pady=5)
+        ttk.Label(settings_frame, text="Max Concurrent Stages:").grid(row=2, column=0, sticky=tk.W, padx=5, pady=5)
+        self.max_concurrency_var = tk.IntVar(value=self.config.get("max_concurrent_stages", 2))
+        ttk.Spinbox(settings_frame, from_=1, to=8, textvariable=self.max_concurrency_var, width=5).grid(
+            row=2, column=1, sticky=tk.W, padx=5, pady=5)
+        self.use_worker_pool_var = tk.BooleanVar(value=self.config.get("use_worker_pool", False))
+        ttk.Checkbutton(settings_frame, text="Keep a warm worker process (TensorFlow/OpenCV preloaded)",
+                        variable=self.use_worker_pool_var).grid(row=3, column=0, columnspan=3, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(settings_frame, text="Copy Workers:").grid(row=4, column=0, sticky=tk.W, padx=5, pady=5)
+        self.copy_workers_var = tk.IntVar(value=self.config.get("copy_workers", 4))
+        ttk.Spinbox(settings_frame, from_=1, to=16, textvariable=self.copy_workers_var, width=5).grid(
+            row=4, column=1, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(settings_frame, text="Same-Disk Copies:").grid(row=5, column=0, sticky=tk.W, padx=5, pady=5)
+        self.copy_link_mode_var = tk.StringVar(value=self.config.get("copy_link_mode", "reflink"))
+        ttk.Combobox(settings_frame, textvariable=self.copy_link_mode_var, values=LINK_MODES, state="readonly", width=10).grid(
+            row=5, column=1, sticky=tk.W, padx=5, pady=5)
+        self.copy_verify_hash_var = tk.BooleanVar(value=self.config.get("copy_verify_hash", False))
+        ttk.Checkbutton(settings_frame, text="Compare file contents when size matches but timestamps differ",
+                        variable=self.copy_verify_hash_var).grid(row=6, column=0, columnspan=3, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(settings_frame, text="Captured Images:").grid(row=7, column=0, sticky=tk.W, padx=5, pady=5)
+        self.capture_mode_var = tk.StringVar(value=self.config.get("capture_mode", "full"))
+        ttk.Combobox(settings_frame, textvariable=self.capture_mode_var, values=CAPTURE_MODES, state="readonly", width=10).grid(
+            row=7, column=1, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(settings_frame, text="full = camera frames, train = 224px padded copies, both = 224px in data + full frames in data_full",
+                  wraplength=500).grid(row=8, column=0, columnspan=3, sticky=tk.W, padx=5)
+        ttk.Label(settings_frame, text="Capture Cameras:").grid(row=9, column=0, sticky=tk.W, padx=5, pady=5)
+        self.cameras_var = tk.StringVar(value=self.config.get("cameras", ""))
+        ttk.Entry(settings_frame, textvariable=self.cameras_var, width=12).grid(row=9, column=1, sticky=tk.W, padx=5, pady=5)
+        ttk.Button(settings_frame, text="Probe Cameras", command=self.probe_cameras).grid(row=9, column=2, padx=5, pady=5)
+        ttk.Label(settings_frame, text="Comma-separated webcam indices captured together (e.g. 0,1). Leave empty to ask each time.",
+                  wraplength=500).grid(row=10, column=0, columnspan=3, sticky=tk.W, padx=5)
+        ttk.Label(settings_frame, text="Workflow Compression:").grid(row=11, column=0, sticky=tk.W, padx=5, pady=5)
+        compress_frame = ttk.Frame(settings_frame)
+        compress_frame.grid(row=11, column=1, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        self.workflow_compress_mode_var = tk.StringVar(value=self.config.get("workflow_compress_mode", "compress"))
+        ttk.Combobox(compress_frame, textvariable=self.workflow_compress_mode_var, values=WORKFLOW_COMPRESS_MODES,
+                     state="readonly", width=9).pack(side=tk.LEFT)
+        ttk.Label(compress_frame, text="Quality:").pack(side=tk.LEFT, padx=(10, 2))
+        self.workflow_quality_var = tk.IntVar(value=self.config.get("workflow_compress_quality", 50))
+        ttk.Spinbox(compress_frame, from_=10, to=100, textvariable=self.workflow_quality_var, width=5).pack(side=tk.LEFT)
+        ttk.Label(compress_frame, text="Target KB:").pack(side=tk.LEFT, padx=(10, 2))
+        self.workflow_target_kb_var = tk.IntVar(value=self.config.get("workflow_target_kb", 200))
+        ttk.Spinbox(compress_frame, from_=10, to=5000, textvariable=self.workflow_target_kb_var, width=6).pack(side=tk.LEFT)
+        ttk.Label(settings_frame, text="How the Complete Workflow processes each captured class: compress = fixed JPEG quality, "
+                                       "target = highest quality under Target KB, none = keep images as captured",
+                  wraplength=500).grid(row=12, column=0, columnspan=3, sticky=tk.W, padx=5)
         ttk.Button(settings_frame, text="Save Settings", command=self.save_settings).grid(
-            row=2, column=1, padx=5, pady=20)
+            row=13, column=1, padx=5, pady=20)
     def build_help_tab(self):
         help_frame = ttk.Frame(self.help_tab, padding=20)
         help_frame.pack(fill=tk.BOTH, expand=True)
@@ -261,16 +365,36 @@ class IMSApplication:
         buttons_frame = ttk.Frame(logs_frame)
         buttons_frame.pack(fill=tk.X, pady=10)
         ttk.Button(buttons_frame, text="View Logs", command=self.view_logs).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="Load Older", command=self.load_older_logs).pack(side=tk.LEFT, padx=5)
         ttk.Button(buttons_frame, text="Clear Logs", command=self.clear_logs).pack(side=tk.LEFT, padx=5)
         ttk.Button(buttons_frame, text="Save Logs as TXT", command=self.save_logs_as_txt).pack(side=tk.LEFT, padx=5)
         ttk.Button(buttons_frame, text="View Excel Folder", command=self.view_excel_folder).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="Timing Report", command=self.view_trace_report).pack(side=tk.LEFT, padx=5)
         self.autoscroll_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(buttons_frame, text="Auto-scroll to latest", variable=self.autoscroll_var).pack(side=tk.RIGHT)
+        search_frame = ttk.Frame(logs_frame)
+        search_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(search_frame, text="Search:").pack(side=tk.LEFT, padx=5)
+        self.log_search_var = tk.StringVar()
+        ttk.Entry(search_frame, textvariable=self.log_search_var, width=25).pack(side=tk.LEFT, padx=5)
+        ttk.Label(search_frame, text="Level:").pack(side=tk.LEFT, padx=5)
+        self.log_level_var = tk.StringVar(value="")
+        ttk.Combobox(search_frame, textvariable=self.log_level_var, width=9, state="readonly",
+                     values=("", "DEBUG", "INFO", "WARNING", "ERROR")).pack(side=tk.LEFT, padx=5)
+        ttk.Label(search_frame, text="Stage:").pack(side=tk.LEFT, padx=5)
+        self.log_stage_var = tk.StringVar(value="")
+        ttk.Entry(search_frame, textvariable=self.log_stage_var, width=10).pack(side=tk.LEFT, padx=5)
+        ttk.Button(search_frame, text="Search", command=self.search_logs).pack(side=tk.LEFT, padx=5)
+        self.log_status_var = tk.StringVar(value="")
+        ttk.Label(logs_frame, textvariable=self.log_status_var).pack(anchor=tk.W)
         self.log_text = tk.Text(logs_frame, wrap=tk.WORD, height=20, width=70)
         self.log_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         scrollbar = ttk.Scrollbar(self.log_text, command=self.log_text.yview)
         self.log_text.configure(yscrollcommand=scrollbar.set)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.log_tail_offset = None
+        self.log_older_cursor = None
+        self.log_tail_job = None
     def view_excel_folder(self):
         try:
             excel_folder = os.path.join(self.config["installation_dir"], "IMS EXCEL")
@@ -288,32 +412,121 @@ class IMSApplication:
                 subprocess.Popen(['open' if sys.platform == 'darwin' else 'xdg-open', excel_folder])
         except Exception as e:
             messagebox.showerror("Error", f"Failed to open Excel folder: {e}")
+    def log_file_path(self):
+        return os.path.join(self.config["installation_dir"], "ims_debug.log")
+    def set_log_text(self, content):
+        self.log_text.config(state=tk.NORMAL)
+        self.log_text.delete(1.0, tk.END)
+        self.log_text.insert(tk.END, content)
+        self.log_text.config(state=tk.DISABLED)
     def view_logs(self):
         try:
-            self.log_text.config(state=tk.NORMAL)
-            self.log_text.delete(1.0, tk.END)
-            log_file_path = os.path.join(self.config["installation_dir"], "ims_debug.log")
+            log_file_path = self.log_file_path()
+            if not os.path.exists(log_file_path):
+                self.set_log_text("Log file not found.")
+                return
+            end = os.path.getsize(log_file_path)
+            start, content = read_chunk_before(log_file_path, end, LOG_PAGE_BYTES)
+            self.set_log_text(content)
+            self.log_tail_offset = end
+            self.log_older_cursor = (0, start)
+            self.log_status_var.set(f"Live tail of {log_file_path}")
+            if self.autoscroll_var.get():
+                self.log_text.see(tk.END)
+            if self.log_tail_job is None:
+                self.log_tail_job = self.root.after(LOG_TAIL_INTERVAL_MS, self.tail_logs)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to read log file: {e}")
+    def tail_logs(self):
+        self.log_tail_job = None
+        if self.log_tail_offset is None:
+            return
+        try:
+            log_file_path = self.log_file_path()
             if os.path.exists(log_file_path):
-                with open(log_file_path, "r") as log_file:
-                    content = log_file.read()
+                previous_offset = self.log_tail_offset
+                self.log_tail_offset, content = read_new(log_file_path, self.log_tail_offset)
+                if self.log_tail_offset < previous_offset:
+                    self.log_older_cursor = None
+                if content:
+                    self.log_text.config(state=tk.NORMAL)
                     self.log_text.insert(tk.END, content)
-                if self.autoscroll_var.get():
-                    self.log_text.see(tk.END)
-            else:
-                self.log_text.insert(tk.END, "Log file not found.")
-            self.log_text.config(state=tk.DISABLED)
+                    line_count = int(self.log_text.index("end-1c").split(".")[0])
+                    if line_count > LOG_MAX_VIEW_LINES:
+                        self.log_text.delete(1.0, f"{line_count - LOG_MAX_VIEW_LINES}.0")
+                        self.log_older_cursor = None
+                    self.log_text.config(state=tk.DISABLED)
+                    if self.autoscroll_var.get():
+                        self.log_text.see(tk.END)
+        except OSError as e:
+            logging.debug(f"Log tail failed: {e}")
+        self.log_tail_job = self.root.after(LOG_TAIL_INTERVAL_MS, self.tail_logs)
+    def load_older_logs(self):
+        if self.log_older_cursor is None:
+            self.log_status_var.set("Open the live view first (View Logs)")
+            return
+        file_index, offset = self.log_older_cursor
+        files = log_files(self.log_file_path())
+        while offset == 0:
+            file_index += 1
+            if file_index >= len(files):
+                self.log_status_var.set("Reached the beginning of the log history")
+                return
+            offset = os.path.getsize(files[file_index])
+        start, content = read_chunk_before(files[file_index], offset, LOG_PAGE_BYTES)
+        self.log_older_cursor = (file_index, start)
+        self.log_text.config(state=tk.NORMAL)
+        self.log_text.insert(1.0, content)
+        self.log_text.config(state=tk.DISABLED)
+        self.log_text.see(1.0)
+        self.log_status_var.set(f"Loaded older entries from {os.path.basename(files[file_index])}")
+    def search_logs(self):
+        text = self.log_search_var.get().strip()
+        level = self.log_level_var.get()
+        stage = self.log_stage_var.get().strip()
+        if not (text or level or stage):
+            self.view_logs()
+            return
+        self.log_tail_offset = None
+        self.log_older_cursor = None
+        self.log_status_var.set("Searching...")
+        def search():
+            try:
+                results = search_logs(self.log_file_path(), text, level, stage)
+            except Exception as e:
+                self.root.after(0, self.log_status_var.set, f"Search failed: {e}")
+                return
+            content = "\n".join(f"[{name}] {line}" for name, line in results)
+            def show():
+                self.set_log_text(content or "No matching log entries.")
+                self.log_status_var.set(f"{len(results)} matching entries (press View Logs to return to the live tail)")
+            self.root.after(0, show)
+        threading.Thread(target=search, daemon=True).start()
+    def view_trace_report(self):
+        self.log_tail_offset = None
+        self.log_older_cursor = None
+        try:
+            spans = load_spans(os.environ["IMS_TRACE_FILE"])
+            self.set_log_text(format_report(spans, self.run_id if any(s.get("run_id") == self.run_id for s in spans) else None))
+            self.log_status_var.set(f"Timing report from {os.environ['IMS_TRACE_FILE']} (press View Logs to return to the live tail)")
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to read log file: {e}")
+            messagebox.showerror("Error", f"Failed to build timing report: {e}")
     def clear_logs(self):
         try:
-            log_file_path = os.path.join(self.config["installation_dir"], "ims_debug.log")
+            log_file_path = self.log_file_path()
             if os.path.exists(log_file_path):
-                with open(log_file_path, "w") as log_file:
-                    log_file.write("")
-                self.log_text.config(state=tk.NORMAL)
-                self.log_text.delete(1.0, tk.END)
-                self.log_text.insert(tk.END, "Logs have been cleared.")
-                self.log_text.config(state=tk.DISABLED)
+                if os.path.abspath(log_handler.baseFilename) == os.path.abspath(log_file_path):
+                    log_handler.acquire()
+                    try:
+                        log_handler.doRollover()
+                    finally:
+                        log_handler.release()
+                else:
+                    with open(log_file_path, "w") as log_file:
+                        log_file.write("")
+                self.log_tail_offset = 0
+                self.log_older_cursor = (0, 0)
+                self.set_log_text("Logs have been cleared (previous log archived as ims_debug.log.1).")
                 messagebox.showinfo("Success", "Log file has been cleared.")
             else:
                 messagebox.showinfo("Info", "Log file not found.")
@@ -321,7 +534,7 @@ class IMSApplication:
             messagebox.showerror("Error", f"Failed to clear log file: {e}")
     def save_logs_as_txt(self):
         try:
-            log_file_path = os.path.join(self.config["installation_dir"], "ims_debug.log")
+            log_file_path = self.log_file_path()
             if not os.path.exists(log_file_path):
                 messagebox.showinfo("Info", "Log file not found.")
                 return
@@ -333,14 +546,17 @@ class IMSApplication:
             )
             if not save_path:
                 return
-            with open(log_file_path, "r") as src_file:
-                content = src_file.read()
-            with open(save_path, "w") as dst_file:
-                dst_file.write(content)
+            shutil.copyfile(log_file_path, save_path)
             messagebox.showinfo("Success", f"Logs saved to {save_path}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save log file: {e}")
     def change_directory(self):
+        if self.copy_engine and not self.copy_engine.done:
+            messagebox.showinfo("Copy in Progress", "Wait for the current copy to finish or cancel it first.")
+            return
+        if self.pipeline and not self.pipeline.done:
+            messagebox.showinfo("Workflow Running", "Wait for the workflow to finish or cancel it before changing folders.")
+            return
         new_dir = filedialog.askdirectory(initialdir=self.config["installation_dir"])
         if not new_dir:
             return
@@ -350,54 +566,150 @@ class IMSApplication:
         )
         if confirm:
             old_dir = self.config["installation_dir"]
-            self.config["installation_dir"] = new_dir
-            self.dir_var.set(new_dir)
-            self.config["data_dir"] = os.path.join(new_dir, "data")
-            self.config["models_dir"] = os.path.join(new_dir, "models")
-            self.data_dir_var.set(self.config["data_dir"])
-            self.models_dir_var.set(self.config["models_dir"])
-            os.makedirs(self.config["data_dir"], exist_ok=True)
-            os.makedirs(self.config["models_dir"], exist_ok=True)
             copy_data = messagebox.askyesno(
                 "Copy Data",
-                "Do you want to copy existing data and models to the new location?"
+                "Do you want to copy existing data and models to the new location?\n"
+                "The current folder stays in use until the copy has finished."
             )
             if copy_data:
                 self.copy_data(old_dir, new_dir)
-            self.save_config()
+            else:
+                self.switch_installation_dir(new_dir)
+    def switch_installation_dir(self, new_dir):
+        self.config["installation_dir"] = new_dir
+        os.environ["IMS_TRACE_FILE"] = os.path.join(new_dir, TRACE_FILE_NAME)
+        self.dir_var.set(new_dir)
+        self.config["data_dir"] = os.path.join(new_dir, "data")
+        self.config["models_dir"] = os.path.join(new_dir, "models")
+        self.data_dir_var.set(self.config["data_dir"])
+        self.models_dir_var.set(self.config["models_dir"])
+        os.makedirs(self.config["data_dir"], exist_ok=True)
+        os.makedirs(self.config["models_dir"], exist_ok=True)
+        self.save_config()
+        logging.info(f"Installation directory changed to {new_dir}")
+    def copy_in_progress(self):
+        if self.copy_engine and not self.copy_engine.done:
+            messagebox.showinfo("Copy in Progress", "Stages can't run while data is being copied to the new installation "
+                                                    "folder. Wait for the copy to finish or cancel it first.")
+            return True
+        return False
     def copy_data(self, old_dir, new_dir):
         try:
-            old_data_dir = os.path.join(old_dir, "data")
-            new_data_dir = os.path.join(new_dir, "data")
-            if os.path.exists(old_data_dir):
-                for item in os.listdir(old_data_dir):
-                    s = os.path.join(old_data_dir, item)
-                    d = os.path.join(new_data_dir, item)
-                    if os.path.isdir(s):
-                        shutil.copytree(s, d, dirs_exist_ok=True)
-                    else:
-                        shutil.copy2(s, d)
-            old_models_dir = os.path.join(old_dir, "models")
-            new_models_dir = os.path.join(new_dir, "models")
-            if os.path.exists(old_models_dir):
-                for item in os.listdir(old_models_dir):
-                    s = os.path.join(old_models_dir, item)
-                    d = os.path.join(new_models_dir, item)
-                    shutil.copy2(s, d)
-            messagebox.showinfo("Success", "Data and models copied successfully!")
+            self.copy_engine = CopyEngine(
+                [(os.path.join(old_dir, "data"), os.path.join(new_dir, "data")),
+                 (os.path.join(old_dir, "data_full"), os.path.join(new_dir, "data_full")),
+                 (os.path.join(old_dir, "models"), os.path.join(new_dir, "models"))],
+                workers=self.config.get("copy_workers", 4),
+                link_mode=self.config.get("copy_link_mode", "reflink"),
+                verify_hash=self.config.get("copy_verify_hash", False)
+            )
+            self.config["pending_copy"] = {"from": old_dir, "to": new_dir}
+            self.save_config()
+            self.copy_target = new_dir
+            self.copy_engine.start()
+            self.cancel_copy_button.config(state=tk.NORMAL)
+            self.refresh_copy_progress()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to copy data: {e}")
+    def resume_pending_copy(self):
+        pending = self.config["pending_copy"]
+        if messagebox.askyesno("Resume Copy",
+                               f"Copying from {pending['from']} to {pending['to']} did not finish. Resume it now?"):
+            self.copy_data(pending["from"], pending["to"])
+        else:
+            self.config.pop("pending_copy", None)
+            self.save_config()
+    def cancel_copy(self):
+        if self.copy_engine and not self.copy_engine.done:
+            self.copy_engine.cancel()
+            self.copy_status_var.set("Cancelling copy... it will be offered for resume on next start")
+    def refresh_copy_progress(self):
+        engine = self.copy_engine
+        if engine is None:
+            return
+        snapshot = engine.snapshot()
+        if snapshot["total_bytes"]:
+            self.copy_progress_var.set(snapshot["done_bytes"] / snapshot["total_bytes"] * 100)
+        self.copy_status_var.set(
+            f"Copying {snapshot['done_files']}/{snapshot['total_files']} files, "
+            f"{snapshot['done_bytes'] / 1e6:.1f}/{snapshot['total_bytes'] / 1e6:.1f} MB at "
+            f"{snapshot['throughput'] / 1e6:.1f} MB/s ({snapshot['skipped']} unchanged, {snapshot['linked']} linked)"
+        )
+        if not snapshot["done"]:
+            self.root.after(250, self.refresh_copy_progress)
+            return
+        self.cancel_copy_button.config(state=tk.DISABLED)
+        summary = (f"{snapshot['copied'] + snapshot['resumed']} copied, {snapshot['linked']} linked, "
+                   f"{snapshot['skipped']} unchanged, {snapshot['failed']} failed in {snapshot['elapsed']:.1f}s")
+        self.copy_status_var.set(("Copy cancelled: " if snapshot["cancelled"] else "Copy finished: ") + summary)
+        if snapshot["cancelled"]:
+            return
+        if snapshot["failed"] or snapshot["errors"]:
+            messagebox.showerror("Error", f"Failed to copy some files ({summary}), still using "
+                                          f"{self.config['installation_dir']}:\n" + "\n".join(snapshot["errors"][:10]))
+            return
+        self.config.pop("pending_copy", None)
+        self.switch_installation_dir(self.copy_target)
+        messagebox.showinfo("Success", f"Data and models copied successfully! ({summary})\nNow using {self.copy_target}")
     def browse_directory(self, var):
         directory = filedialog.askdirectory(initialdir=var.get())
         if directory:
             var.set(directory)
     def save_settings(self):
+        cameras = self.cameras_var.get().replace(" ", "")
+        if cameras:
+            try:
+                parse_camera_indices(cameras)
+            except ValueError:
+                messagebox.showerror("Settings", "Capture cameras must be distinct integers separated by commas, e.g. 0,1")
+                return
+        try:
+            quality = int(self.workflow_quality_var.get())
+            target_kb = int(self.workflow_target_kb_var.get())
+        except (tk.TclError, ValueError):
+            messagebox.showerror("Settings", "Workflow compression quality and target size must be whole numbers")
+            return
+        if not (10 <= quality <= 100 and target_kb > 0):
+            messagebox.showerror("Settings", "Workflow compression quality must be 10-100 and the target size positive")
+            return
         self.config["data_dir"] = self.data_dir_var.get()
         self.config["models_dir"] = self.models_dir_var.get()
+        self.config["max_concurrent_stages"] = self.max_concurrency_var.get()
+        self.config["use_worker_pool"] = self.use_worker_pool_var.get()
+        self.config["copy_workers"] = self.copy_workers_var.get()
+        self.config["copy_link_mode"] = self.copy_link_mode_var.get()
+        self.config["copy_verify_hash"] = self.copy_verify_hash_var.get()
+        self.config["capture_mode"] = self.capture_mode_var.get()
+        os.environ["IMS_CAPTURE_MODE"] = self.config["capture_mode"]
+        self.config["cameras"] = cameras
+        self.config["workflow_compress_mode"] = self.workflow_compress_mode_var.get()
+        self.config["workflow_compress_quality"] = quality
+        self.config["workflow_target_kb"] = target_kb
+        os.environ["IMS_CAMERAS"] = cameras
+        if not self.config["use_worker_pool"] and self.worker_pool is not None:
+            self.worker_pool.shutdown()
+            self.worker_pool = None
         os.makedirs(self.config["data_dir"], exist_ok=True)
         os.makedirs(self.config["models_dir"], exist_ok=True)
         self.save_config()
         messagebox.showinfo("Settings", "Settings saved successfully!")
+    def probe_cameras(self):
+        def probe():
+            try:
+                script_path = os.path.join(self.config["installation_dir"], "camera_probe.py")
+                env = self.stage_env(IMS_CAMERAS=self.cameras_var.get().replace(" ", "") or "0")
+                process = self.launch_stage(script_path, env, label="CAMERA_PROBE")
+                if process.wait() != 0:
+                    raise RuntimeError("\n".join(process.stderr_tail) or f"exit code {process.returncode}")
+                with open(self.config_file, "r") as f:
+                    self.config["camera"] = json.load(f).get("camera", {})
+                summary = "\n".join(f"Camera {index}: {s['width']}x{s['height']} {s['fourcc']}, {s['measured_fps']} fps, "
+                                    f"{s['latency_ms']} ms" for index, s in self.config["camera"].items())
+                messagebox.showinfo("Camera Probe", f"Saved camera settings:\n{summary}")
+            except Exception as e:
+                logging.exception("Camera probe failed")
+                messagebox.showerror("Error", f"Camera probe failed: {e}")
+        threading.Thread(target=probe, daemon=True).start()
     def show_epoch_status(self):
         try:
             script_path = os.path.join(self.config["installation_dir"], "epoch_status_window.py")
@@ -405,30 +717,36 @@ class IMSApplication:
         except Exception as e:
             messagebox.showerror("Error", f"Failed to open epoch status window: {e}")
     def run_capture_images(self):
+        if self.copy_in_progress():
+            return
         try:
             script_path = os.path.join(self.config["installation_dir"], "capture_images.py")
             env = os.environ.copy()
             env["IMS_INSTALLATION_DIR"] = self.config["installation_dir"]
             env["IMS_DATA_DIR"] = self.config["data_dir"]
             env["IMS_MODELS_DIR"] = self.config["models_dir"]
-            subprocess.Popen([self.python_executable, script_path], env=env)
+            self.launch_stage(script_path, env)
             self.workflow_status["capture"] = True
             getattr(self, "status_capture").set("✅")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to run capture_images.py: {e}")
     def run_append_images(self):
+        if self.copy_in_progress():
+            return
         try:
             script_path = os.path.join(self.config["installation_dir"], "append_images.py")
             env = os.environ.copy()
             env["IMS_INSTALLATION_DIR"] = self.config["installation_dir"]
             env["IMS_DATA_DIR"] = self.config["data_dir"]
             env["IMS_MODELS_DIR"] = self.config["models_dir"]
-            subprocess.Popen([self.python_executable, script_path], env=env)
+            self.launch_stage(script_path, env)
             self.workflow_status["append"] = True
             getattr(self, "status_append").set("✅")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to run append_images.py: {e}")
     def run_compress_images(self):
+        if self.copy_in_progress():
+            return
         def compress():
             try:
                 script_path = os.path.join(self.config["installation_dir"], "compress_images.py")
@@ -440,13 +758,17 @@ class IMSApplication:
                 env = os.environ.copy()
                 env["IMS_INPUT_DIR"] = input_dir
                 env["IMS_OUTPUT_DIR"] = output_dir
-                subprocess.run([self.python_executable, script_path], env=env, check=True)
+                returncode = self.launch_stage(script_path, env).wait()
+                if returncode != 0:
+                    raise subprocess.CalledProcessError(returncode, script_path)
                 messagebox.showinfo("Success", "Image compression completed successfully!")
             except Exception as e:
                 logging.exception("Failed to execute compress_images.py")
                 messagebox.showerror("Error", f"Failed to execute compress_images.py: {e}")
         threading.Thread(target=compress, daemon=True).start()
     def run_image_modification(self):
+        if self.copy_in_progress():
+            return
         def modify():
             try:
                 script_path = os.path.join(self.config["installation_dir"], "compress_images.py")
@@ -456,7 +778,9 @@ class IMSApplication:
                 env["IMS_DATA_DIR"] = self.config["data_dir"]
                 env["IMS_INPUT_DIR"] = self.config["data_dir"]
                 env["IMS_OUTPUT_DIR"] = self.config["data_dir"]
-                subprocess.run([self.python_executable, script_path], env=env, check=True)
+                returncode = self.launch_stage(script_path, env).wait()
+                if returncode != 0:
+                    raise subprocess.CalledProcessError(returncode, script_path)
                 self.workflow_status["compress"] = True
                 getattr(self, "status_image").set("✅")
                 messagebox.showinfo("Success", "Image modification completed successfully!")
@@ -465,46 +789,60 @@ class IMSApplication:
                 messagebox.showerror("Error", f"Failed to execute compress_images.py: {e}")
         threading.Thread(target=modify, daemon=True).start()
     def run_train_model(self):
+        start_at = self.train_start_var.get().strip()
+        try:
+            start_time = datetime.datetime.strptime(start_at, "%H:%M").time() if start_at else None
+        except ValueError:
+            messagebox.showerror("Error", "Start time must be in HH:MM format (e.g. 22:30).")
+            return
+        if self.train_schedule is not None:
+            _, pending_time = self.train_schedule
+            if not messagebox.askyesno("Training Scheduled",
+                                       f"Training is already scheduled for {pending_time.strftime('%Y-%m-%d %H:%M')}. "
+                                       f"Cancel that schedule and {'reschedule' if start_time else 'train now'}?"):
+                return
+            self.cancel_train_schedule()
+        if start_time is None:
+            self.start_train_model()
+            return
+        now = datetime.datetime.now()
+        scheduled = datetime.datetime.combine(now.date(), start_time)
+        if scheduled <= now:
+            scheduled += datetime.timedelta(days=1)
+        delay_ms = int((scheduled - now).total_seconds() * 1000)
+        self.train_schedule = (self.root.after(delay_ms, self.run_scheduled_training), scheduled)
+        self.cancel_schedule_button.config(state=tk.NORMAL)
+        self.epoch_progress_var.set(f"Training scheduled for {scheduled.strftime('%Y-%m-%d %H:%M')}")
+        logging.info(f"Training scheduled for {scheduled}")
+    def run_scheduled_training(self):
+        self.train_schedule = None
+        self.cancel_schedule_button.config(state=tk.DISABLED)
+        self.start_train_model()
+    def cancel_train_schedule(self):
+        if self.train_schedule is None:
+            return
+        after_id, scheduled = self.train_schedule
+        self.root.after_cancel(after_id)
+        self.train_schedule = None
+        self.cancel_schedule_button.config(state=tk.DISABLED)
+        self.epoch_progress_var.set("Scheduled training cancelled")
+        logging.info(f"Training scheduled for {scheduled} cancelled")
+    def start_train_model(self):
+        if self.copy_in_progress():
+            return
         def train():
             try:
                 self.show_epoch_status()
                 script_path = os.path.join(self.config["installation_dir"], "train.py")
                 logging.info(f"Starting training script: {script_path}")
-                signal_file = os.path.join(self.config["installation_dir"], "stop_training.signal")
-                if os.path.exists(signal_file):
-                    try:
-                        os.remove(signal_file)
-                    except:
-                        pass
                 env = os.environ.copy()
                 env["IMS_INSTALLATION_DIR"] = self.config["installation_dir"]
                 env["IMS_DATA_DIR"] = self.config["data_dir"]
                 env["IMS_MODELS_DIR"] = self.config["models_dir"]
                 env["IMS_EPOCHS"] = str(self.epochs_var.get())
-                process = subprocess.Popen(
-                    [self.python_executable, script_path],
-                    env=env,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-                for line in process.stdout:
-                    logging.info(f"TRAIN OUTPUT: {line.strip()}")
-                    if "Epoch" in line and "/" in line:
-                        parts = line.split()
-                        for part in parts:
-                            if "/" in part:
-                                try:
-                                    current_epoch, total_epochs = map(int, part.split("/"))
-                                    progress = int((current_epoch / total_epochs) * 100)
-                                    self.epoch_progress_var.set(f"Epoch Progress: {progress}%")
-                                    self.root.update_idletasks()
-                                except ValueError:
-                                    continue
-                    if "Training interrupted" in line or "Training was interrupted" in line:
-                        logging.info("Training was interrupted and previous model was used")
-                        messagebox.showinfo("Training Interrupted",
-                                          "Training was interrupted. Using previously saved model.")
+                if self.time_budget_var.get().strip():
+                    env["IMS_TIME_BUDGET"] = f"{float(self.time_budget_var.get())}m"
+                process = self.launch_stage(script_path, env, on_event=self.on_train_event, label="TRAIN")
                 process.wait()
                 if process.returncode == 0:
                     self.workflow_status["train"] = True
@@ -517,49 +855,158 @@ class IMSApplication:
                         messagebox.showinfo("Training",
                                           "Training process finished with issues, but a model is available.")
                     else:
-                        error_message = process.stderr.read()
+                        error_message = "\n".join(process.stderr_tail)
                         logging.error(f"TRAIN ERROR: {error_message}")
                         messagebox.showerror("Training Error", f"Training failed: {error_message}")
             except Exception as e:
                 logging.exception("Failed to run train.py")
                 messagebox.showerror("Error", f"Failed to run train.py: {e}")
         threading.Thread(target=train, daemon=True).start()
+    def on_train_event(self, event):
+        if event.get("type") == "epoch":
+            progress = int(event["epoch"] / event["total_epochs"] * 100)
+            self.root.after(0, self.epoch_progress_var.set, f"Epoch Progress: {progress}% (epoch {event['epoch']}/{event['total_epochs']})")
+        elif event.get("type") == "interrupted":
+            logging.info("Training was interrupted and previous model was used")
+            self.root.after(0, lambda: messagebox.showinfo("Training Interrupted",
+                                                           "Training was interrupted. Using previously saved model."))
     def run_test_model(self):
+        if self.copy_in_progress():
+            return
         try:
             script_path = os.path.join(self.config["installation_dir"], "excel_model.py")
             env = os.environ.copy()
             env["IMS_INSTALLATION_DIR"] = self.config["installation_dir"]
             env["IMS_DATA_DIR"] = self.config["data_dir"]
             env["IMS_MODELS_DIR"] = self.config["models_dir"]
-            subprocess.Popen([self.python_executable, script_path], env=env)
+            self.launch_stage(script_path, env)
             self.workflow_status["test"] = True
             getattr(self, "status_test").set("✅")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to run excel_model.py: {e}")
+    def get_worker_pool(self):
+        if not self.config.get("use_worker_pool", False):
+            return None
+        if self.worker_pool is None:
+            self.worker_pool = WorkerPool(self.python_executable)
+            self.worker_pool.prestart()
+            logging.info("Started warm stage worker")
+        return self.worker_pool
+    def launch_stage(self, script_path, env, on_event=None, label=None, args=None):
+        label = label or os.path.splitext(os.path.basename(script_path))[0].upper()
+        pool = self.get_worker_pool()
+        if pool is not None:
+            process = pool.run(script_path, env=env, args=args)
+        else:
+            process = subprocess.Popen([self.python_executable, script_path] + list(args or []), env={**env, "PYTHONUNBUFFERED": "1"},
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return ProcessRunner(process, label, on_event=on_event)
+    def on_close(self):
+        if self.copy_engine and not self.copy_engine.done:
+            if not messagebox.askyesno("Copy in Progress", "A copy is still running. Stop it and exit? It can be resumed later."):
+                return
+            self.copy_engine.cancel()
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
+        self.root.destroy()
+    def start_run(self):
+        self.run_id = make_run_id()
+        os.environ["IMS_RUN_ID"] = self.run_id
+        logging.info(f"Trace run ID: {self.run_id}")
+    def stage_env(self, **extra):
+        env = os.environ.copy()
+        env["IMS_INSTALLATION_DIR"] = self.config["installation_dir"]
+        env["IMS_DATA_DIR"] = self.config["data_dir"]
+        env["IMS_MODELS_DIR"] = self.config["models_dir"]
+        env.update(extra)
+        return env
+    def stage_launcher(self, script, env, on_event=None, args=None):
+        script_path = os.path.join(self.config["installation_dir"], script)
+        return lambda: self.launch_stage(script_path, env, on_event=on_event, args=args)
     def run_complete_workflow(self):
-        confirm = messagebox.askyesno(
+        if self.copy_in_progress():
+            return
+        if self.pipeline and not self.pipeline.done:
+            messagebox.showinfo("Workflow", "A workflow is already running.")
+            return
+        classes = simpledialog.askstring(
             "Complete Workflow",
-            "This will run all steps sequentially. Continue?"
+            "Object classes to capture (comma-separated).\nLeave empty to enter the name during capture:",
+            parent=self.root
         )
-        if not confirm:
+        if classes is None:
+            return
+        classes = [c.strip().lower().replace(" ", "_") for c in classes.split(",") if c.strip()]
+        invalid = [c for c in classes if not (0 < len(c) <= 20 and c.isalnum())]
+        if invalid:
+            messagebox.showerror("Complete Workflow", f"Invalid class name(s): {', '.join(invalid)}\n"
+                                                      "Class names must be alphanumeric, 1-20 characters, without spaces or underscores.")
+            return
+        if len(set(classes)) != len(classes):
+            messagebox.showerror("Complete Workflow", "Each class may only be listed once.")
             return
         self.reset_workflow()
-        self.run_capture_images()
-        messagebox.showinfo(
-            "Workflow",
-            "After completing image capture, click OK to continue to the next step."
-        )
-        self.run_compress_images()
-        messagebox.showinfo(
-            "Workflow",
-            "After completing image processing, click OK to continue to the next step."
-        )
-        self.run_train_model()
-        messagebox.showinfo(
-            "Workflow",
-            "After training completes, click OK to continue to the final step."
-        )
-        self.run_test_model()
+        self.start_run()
+        pipeline = Pipeline(max_concurrency=self.config.get("max_concurrent_stages", 2))
+        compress_mode = self.config.get("workflow_compress_mode", "compress")
+        compress_stages = []
+        for object_name in classes or [None]:
+            suffix = f" ({object_name})" if object_name else ""
+            capture_env = self.stage_env(IMS_OBJECT_NAME=object_name) if object_name else self.stage_env()
+            capture = pipeline.add(Stage(f"capture{suffix}", launcher=self.stage_launcher("capture_images.py", capture_env),
+                                         resources=["camera"]))
+            if compress_mode == "none":
+                compress_stages.append(capture.name)
+                continue
+            class_dir = os.path.join(self.config["data_dir"], object_name) if object_name else self.config["data_dir"]
+            compress_env = self.stage_env(IMS_INPUT_DIR=class_dir, IMS_OUTPUT_DIR=class_dir)
+            compress_args = ["--headless", "--input", class_dir, "--mode", compress_mode,
+                             "--quality", str(self.config.get("workflow_compress_quality", 50)),
+                             "--target-kb", str(self.config.get("workflow_target_kb", 200))]
+            compress = pipeline.add(Stage(f"compress{suffix}", launcher=self.stage_launcher("compress_images.py", compress_env,
+                                                                                           args=compress_args),
+                                          deps=[capture.name]))
+            compress_stages.append(compress.name)
+        train_env = self.stage_env(IMS_EPOCHS=str(self.epochs_var.get()))
+        if self.time_budget_var.get().strip():
+            train_env["IMS_TIME_BUDGET"] = f"{float(self.time_budget_var.get())}m"
+        pipeline.add(Stage("train", launcher=self.stage_launcher("train.py", train_env, self.on_train_event), deps=compress_stages,
+                           resources=["gpu"]))
+        pipeline.add(Stage("test", launcher=self.stage_launcher("excel_model.py", self.stage_env()), deps=["train"],
+                           resources=["camera", "gpu"]))
+        self.pipeline = pipeline
+        self.pipeline_tree.delete(*self.pipeline_tree.get_children())
+        for name in pipeline.stages:
+            self.pipeline_tree.insert("", tk.END, iid=name, text=name, values=("pending", "-"))
+        self.show_epoch_status()
+        pipeline.start()
+        logging.info(f"Started workflow pipeline with stages: {', '.join(pipeline.stages)}")
+        self.refresh_pipeline_view()
+    def cancel_workflow(self):
+        if self.pipeline and not self.pipeline.done:
+            if messagebox.askyesno("Cancel Workflow", "Stop all running workflow stages?"):
+                self.pipeline.cancel()
+    def refresh_pipeline_view(self):
+        pipeline = self.pipeline
+        if pipeline is None:
+            return
+        running = []
+        for name, state, duration, error in pipeline.snapshot():
+            duration_text = f"{duration:.1f}s" if duration is not None else "-"
+            self.pipeline_tree.item(name, values=(state if not error else f"{state}: {error}", duration_text))
+            if state == RUNNING:
+                running.append(name)
+            if state == DONE:
+                workflow_key = name.split(" ")[0]
+                self.workflow_status[workflow_key] = True
+                getattr(self, "status_image" if workflow_key == "compress" else f"status_{workflow_key}").set("✅")
+        if pipeline.finished is not None:
+            total = pipeline.finished - pipeline.started
+            failed = [name for name, state, _, _ in pipeline.snapshot() if state == FAILED]
+            self.pipeline_status_var.set(f"Workflow finished in {total:.1f}s" + (f", failed: {', '.join(failed)}" if failed else ""))
+            return
+        self.pipeline_status_var.set(f"Running: {', '.join(running)}" if running else "Waiting for next stage...")
+        self.root.after(500, self.refresh_pipeline_view)
     def reset_workflow(self):
         for key in self.workflow_status:
             self.workflow_status[key] = False
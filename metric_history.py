@@ -0,0 +1,72 @@
+import os
+import json
+
+class MetricSeries:
+    def __init__(self, capacity=512):
+        self.capacity = capacity
+        self.stride = 1
+        self.points = []
+        self.pending = []
+
+    def append(self, x, value):
+        self.pending.append((x, float(value)))
+        if len(self.pending) < self.stride:
+            return
+        self.points.append(self._mean(self.pending))
+        self.pending = []
+        if len(self.points) >= self.capacity:
+            self.points = [self._mean(self.points[i:i + 2]) for i in range(0, len(self.points), 2)]
+            self.stride *= 2
+
+    def values(self):
+        if self.pending:
+            return self.points + [self._mean(self.pending)]
+        return list(self.points)
+
+    def _mean(self, items):
+        return (items[-1][0], sum(v for _, v in items) / len(items))
+
+    def to_dict(self):
+        return {"stride": self.stride, "points": self.values()}
+
+    @classmethod
+    def from_dict(cls, data, capacity=512):
+        series = cls(capacity)
+        series.stride = data.get("stride", 1)
+        series.points = [tuple(p) for p in data.get("points", [])][-capacity:]
+        return series
+
+class MetricHistory:
+    def __init__(self, capacity=512):
+        self.capacity = capacity
+        self.series = {}
+
+    def record(self, name, x, value):
+        if value is None:
+            return
+        if name not in self.series:
+            self.series[name] = MetricSeries(self.capacity)
+        self.series[name].append(x, value)
+
+    def get(self, name):
+        series = self.series.get(name)
+        return series.values() if series else []
+
+    def to_dict(self):
+        return {name: series.to_dict() for name, series in self.series.items()}
+
+    def save(self, path, **extra):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({**extra, "series": self.to_dict()}, f)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path, capacity=512):
+        history = cls(capacity)
+        with open(path, "r") as f:
+            data = json.load(f)
+        for name, series in data.get("series", {}).items():
+            history.series[name] = MetricSeries.from_dict(series, capacity)
+        return history
@@ -0,0 +1,160 @@
+import subprocess
+import threading
+import time
+import logging
+from ims_trace import record_span
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, SKIPPED, CANCELLED)
+
+class Stage:
+    def __init__(self, name, command=None, func=None, launcher=None, deps=(), env=None, resources=()):
+        if command is None and func is None and launcher is None:
+            raise ValueError(f"Stage {name} needs a command, a function or a launcher")
+        self.name = name
+        self.command = command
+        self.func = func
+        self.launcher = launcher
+        self.deps = list(deps)
+        self.env = env
+        self.resources = set(resources)
+        self.state = PENDING
+        self.process = None
+        self.returncode = None
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    @property
+    def duration(self):
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+    def run(self):
+        if self.func is not None:
+            self.func()
+            return 0
+        if self.launcher is not None:
+            self.process = self.launcher()
+        else:
+            self.process = subprocess.Popen(self.command, env=self.env)
+        return self.process.wait()
+
+    def terminate(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+class Pipeline:
+    def __init__(self, max_concurrency=2, on_change=None):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.on_change = on_change
+        self.stages = {}
+        self.lock = threading.Condition()
+        self.cancelled = False
+        self.thread = None
+        self.started = None
+        self.finished = None
+
+    def add(self, stage):
+        for dep in stage.deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage {stage.name} depends on unknown stage {dep}")
+        self.stages[stage.name] = stage
+        return stage
+
+    def start(self):
+        self.started = time.time()
+        self.thread = threading.Thread(target=self._schedule, daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            for stage in self.stages.values():
+                stage.terminate()
+            self.lock.notify_all()
+
+    @property
+    def done(self):
+        return all(stage.state in FINISHED_STATES for stage in self.stages.values())
+
+    def snapshot(self):
+        with self.lock:
+            return [(s.name, s.state, s.duration, s.error) for s in self.stages.values()]
+
+    def timings(self):
+        return {s.name: s.duration for s in self.stages.values() if s.duration is not None}
+
+    def _notify(self):
+        if self.on_change:
+            try:
+                self.on_change(self)
+            except Exception as e:
+                logging.error(f"Pipeline change callback failed: {e}")
+
+    def _ready(self):
+        running = [s for s in self.stages.values() if s.state == RUNNING]
+        if len(running) >= self.max_concurrency:
+            return []
+        busy = set().union(*(s.resources for s in running)) if running else set()
+        ready = []
+        for stage in self.stages.values():
+            if stage.state != PENDING:
+                continue
+            dep_states = [self.stages[d].state for d in stage.deps]
+            if any(state in (FAILED, SKIPPED, CANCELLED) for state in dep_states):
+                stage.state = SKIPPED
+                logging.info(f"Pipeline stage '{stage.name}' skipped, a dependency did not complete")
+                continue
+            if all(state == DONE for state in dep_states) and not (stage.resources & busy):
+                ready.append(stage)
+                busy |= stage.resources
+                if len(running) + len(ready) >= self.max_concurrency:
+                    break
+        return ready
+
+    def _schedule(self):
+        with self.lock:
+            while not self.done:
+                if self.cancelled:
+                    for stage in self.stages.values():
+                        if stage.state == PENDING:
+                            stage.state = CANCELLED
+                    if not any(s.state == RUNNING for s in self.stages.values()):
+                        break
+                else:
+                    for stage in self._ready():
+                        stage.state = RUNNING
+                        stage.started = time.time()
+                        threading.Thread(target=self._run_stage, args=(stage,), daemon=True).start()
+                self._notify()
+                if not self.done:
+                    self.lock.wait(1.0)
+        self.finished = time.time()
+        self._notify()
+        summary = ", ".join(f"{name} {duration:.1f}s" for name, duration in self.timings().items())
+        logging.info(f"Pipeline finished in {self.finished - self.started:.1f}s ({summary})")
+
+    def _run_stage(self, stage):
+        logging.info(f"Pipeline stage '{stage.name}' started")
+        try:
+            stage.returncode = stage.run()
+            state = DONE if stage.returncode == 0 else FAILED
+            if stage.returncode != 0:
+                stage.error = f"exit code {stage.returncode}"
+        except Exception as e:
+            stage.error = str(e)
+            state = FAILED
+            logging.exception(f"Pipeline stage '{stage.name}' failed")
+        with self.lock:
+            stage.finished = time.time()
+            stage.state = CANCELLED if self.cancelled and state == FAILED else state
+            logging.info(f"Pipeline stage '{stage.name}' {stage.state} after {stage.duration:.1f}s")
+            self.lock.notify_all()
+        record_span(f"workflow {stage.name}", stage.started, stage.duration, ok=stage.state == DONE, state=stage.state)
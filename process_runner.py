@@ -0,0 +1,132 @@
+import re
+import json
+import time
+import threading
+import logging
+from collections import deque
+
+EVENT_PREFIX = "@ims "
+EPOCH_RE = re.compile(r"^Epoch (\d+)/(\d+)$")
+PROGRESS_RE = re.compile(r"^\s*(\d+)/(\d+) \[[=>.]*\]\s*-\s*(?:ETA: (\S+)|(\S+) \S+/step)?(.*)$")
+METRIC_RE = re.compile(r"(\w+): ([-+0-9.eE]+|nan|inf)")
+SEGMENT_RE = re.compile(rb"\r\n|\n|\r")
+
+def emit_event(event_type, **data):
+    print(EVENT_PREFIX + json.dumps({"type": event_type, **data}), flush=True)
+
+def parse_line(line):
+    if line.startswith(EVENT_PREFIX):
+        try:
+            return json.loads(line[len(EVENT_PREFIX):])
+        except json.JSONDecodeError:
+            return None
+    match = EPOCH_RE.match(line)
+    if match:
+        return {"type": "epoch", "epoch": int(match.group(1)), "total_epochs": int(match.group(2))}
+    match = PROGRESS_RE.match(line)
+    if match:
+        metrics = {name: float(value) for name, value in METRIC_RE.findall(match.group(5) or "")}
+        return {
+            "type": "progress",
+            "step": int(match.group(1)),
+            "total_steps": int(match.group(2)),
+            "eta": match.group(3),
+            "metrics": metrics
+        }
+    return None
+
+class ProcessRunner:
+    def __init__(self, process, label, on_event=None, on_line=None, progress_interval=1.0, tail_lines=50):
+        self.process = process
+        self.label = label
+        self.on_event = on_event
+        self.on_line = on_line or self._log_line
+        self.progress_interval = progress_interval
+        self.stderr_tail = deque(maxlen=tail_lines)
+        self.last_progress = {}
+        self.lock = threading.Lock()
+        self.threads = []
+        for name, stream in (("stdout", process.stdout), ("stderr", process.stderr)):
+            if stream is not None:
+                thread = threading.Thread(target=self._pump, args=(name, stream), daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    @property
+    def returncode(self):
+        return self.process.returncode
+
+    def poll(self):
+        return self.process.poll()
+
+    def terminate(self):
+        self.process.terminate()
+
+    def wait(self, timeout=None):
+        returncode = self.process.wait(timeout)
+        for thread in self.threads:
+            thread.join(timeout)
+        return returncode
+
+    def _log_line(self, stream_name, line):
+        level = logging.WARNING if stream_name == "stderr" else logging.INFO
+        logging.log(level, f"{self.label} OUTPUT: {line}")
+
+    def _pump(self, stream_name, stream):
+        buffer = b""
+        pending = None
+        read = getattr(stream, "read1", stream.read)
+        try:
+            while True:
+                chunk = read(4096)
+                if not chunk:
+                    break
+                buffer += chunk
+                position = 0
+                for match in SEGMENT_RE.finditer(buffer):
+                    if match.group() == b"\r" and match.end() == len(buffer):
+                        break
+                    segment = buffer[position:match.start()].decode("utf-8", "replace").replace("\b", "").strip()
+                    position = match.end()
+                    if not segment:
+                        continue
+                    if match.group() == b"\r":
+                        pending = segment
+                        self._progress(stream_name, segment)
+                    else:
+                        pending = None
+                        self._line(stream_name, segment)
+                buffer = buffer[position:]
+            tail = buffer.decode("utf-8", "replace").replace("\b", "").strip()
+            if tail:
+                self._line(stream_name, tail)
+            elif pending:
+                self._progress(stream_name, pending, force=True)
+        except (OSError, ValueError):
+            pass
+        finally:
+            stream.close()
+
+    def _progress(self, stream_name, segment, force=False):
+        now = time.time()
+        if not force and now - self.last_progress.get(stream_name, 0) < self.progress_interval:
+            return
+        self.last_progress[stream_name] = now
+        self._line(stream_name, segment)
+
+    def _line(self, stream_name, line):
+        if stream_name == "stderr":
+            self.stderr_tail.append(line)
+        event = parse_line(line)
+        with self.lock:
+            if not line.startswith(EVENT_PREFIX):
+                self.on_line(stream_name, line)
+            if event is not None and self.on_event:
+                try:
+                    self.on_event(event)
+                except Exception as e:
+                    logging.error(f"{self.label} event handler failed: {e}")
@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import runpy
+import threading
+import importlib
+import subprocess
+import traceback
+import logging
+
+PRELOAD_MODULES = ["numpy", "cv2", "PIL.Image", "pandas", "openpyxl", "tensorflow"]
+
+def preload_modules():
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    saved = os.dup(1), os.dup(2)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    try:
+        for name in PRELOAD_MODULES:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                pass
+    finally:
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        os.close(devnull)
+        os.close(saved[0])
+        os.close(saved[1])
+
+def run_request(request):
+    script = os.path.abspath(request["script"])
+    os.environ.update(request.get("env") or {})
+    os.chdir(request.get("cwd") or os.path.dirname(script))
+    sys.argv = [script] + list(request.get("args") or [])
+    sys.path.insert(0, os.path.dirname(script))
+    runpy.run_path(script, run_name="__main__")
+
+def worker_main():
+    preload_modules()
+    line = sys.stdin.readline()
+    if not line.strip():
+        return 0
+    try:
+        run_request(json.loads(line))
+    except SystemExit:
+        raise
+    except BaseException:
+        traceback.print_exc()
+        return 1
+    return 0
+
+class WorkerPool:
+    def __init__(self, python_executable=sys.executable, size=1):
+        self.python_executable = python_executable
+        self.size = max(1, size)
+        self.idle = []
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def _spawn(self):
+        return subprocess.Popen(
+            [self.python_executable, "-u", os.path.abspath(__file__)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+
+    def prestart(self):
+        with self.lock:
+            self.idle = [w for w in self.idle if w.poll() is None]
+            while not self.closed and len(self.idle) < self.size:
+                self.idle.append(self._spawn())
+
+    def run(self, script, env=None, args=None, cwd=None):
+        with self.lock:
+            worker = None
+            while self.idle and worker is None:
+                candidate = self.idle.pop(0)
+                if candidate.poll() is None:
+                    worker = candidate
+            if worker is None:
+                worker = self._spawn()
+        request = {"script": script, "env": dict(env or {}), "args": args or [], "cwd": cwd}
+        worker.stdin.write((json.dumps(request) + "\n").encode('utf-8'))
+        worker.stdin.close()
+        logging.info(f"Dispatched {os.path.basename(script)} to warm worker (pid {worker.pid})")
+        threading.Thread(target=self.prestart, daemon=True).start()
+        return worker
+
+    def shutdown(self):
+        with self.lock:
+            self.closed = True
+            for worker in self.idle:
+                try:
+                    worker.stdin.close()
+                    worker.wait(timeout=5)
+                except Exception:
+                    worker.kill()
+            self.idle = []
+
+if __name__ == "__main__":
+    sys.exit(worker_main())
@@ -0,0 +1,180 @@
+import socket
+import json
+import threading
+import queue
+import time
+import os
+import logging
+
+STATUS_HOST = "127.0.0.1"
+STATUS_PORT = 5678
+
+def make_job_id(job_name):
+    return os.environ.get("IMS_JOB_ID") or f"{job_name}-{os.getpid()}"
+
+class StatusClient:
+    def __init__(self, job_name="job", job_id=None, host=STATUS_HOST, port=STATUS_PORT, max_queue=1000, retry_interval=1.0):
+        self.job_name = job_name
+        self.job_id = job_id or make_job_id(job_name)
+        self.host = host
+        self.port = port
+        self.retry_interval = retry_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.sock = None
+        self.next_connect = 0
+        self.sent = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def send(self, data):
+        data = {"job_id": self.job_id, "job_name": self.job_name, "timestamp": time.time(), **data}
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(data)
+            except queue.Full:
+                self.dropped += 1
+
+    def close(self, timeout=2.0):
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
+        self._disconnect()
+        if self.dropped:
+            logging.debug(f"Status channel: {self.sent} messages sent, {self.dropped} dropped")
+
+    def _connect(self):
+        if self.sock is not None:
+            return True
+        if time.time() < self.next_connect:
+            return False
+        try:
+            self.sock = socket.create_connection((self.host, self.port), timeout=1.0)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return True
+        except OSError:
+            self.sock = None
+            self.next_connect = time.time() + self.retry_interval
+            return False
+
+    def _disconnect(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def _run(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            if not self._connect():
+                self.dropped += 1
+                continue
+            try:
+                self.sock.sendall((json.dumps(data) + "\n").encode('utf-8'))
+                self.sent += 1
+            except OSError:
+                self.dropped += 1
+                self._disconnect()
+                self.next_connect = time.time() + self.retry_interval
+
+class JobReporter:
+    def __init__(self, job_name, total=0, unit="items", control_port=None, min_interval=0.1, client=None):
+        self.client = client or StatusClient(job_name)
+        self.total = total
+        self.unit = unit
+        self.control_port = control_port
+        self.min_interval = min_interval
+        self.start_time = time.time()
+        self.last_sent = 0
+        self.done = 0
+
+    def update(self, done, message="", force=False, **extra):
+        self.done = done
+        now = time.time()
+        if not force and now - self.last_sent < self.min_interval and done < self.total:
+            return
+        self.last_sent = now
+        elapsed = max(now - self.start_time, 1e-6)
+        throughput = done / elapsed
+        data = {
+            "state": "running",
+            "message": message,
+            "done": done,
+            "total": self.total,
+            "progress": int(done / self.total * 100) if self.total else 0,
+            "throughput": throughput,
+            "throughput_unit": f"{self.unit}/s",
+            "eta_seconds": int((self.total - done) / throughput) if throughput > 0 and self.total else None,
+            **extra
+        }
+        if self.control_port is not None:
+            data["control_port"] = self.control_port
+            data["can_interrupt"] = True
+        self.client.send(data)
+
+    def finish(self, message="", state="finished", **extra):
+        self.update(self.done, message, force=True, **extra)
+        data = {"state": state, "message": message, "eta_seconds": 0, "can_interrupt": False}
+        if state == "finished":
+            data["progress"] = 100
+        self.client.send(data)
+        self.client.close()
+
+def read_messages(client, on_message, is_running=lambda: True):
+    buffer = b""
+    client.settimeout(1.0)
+    try:
+        while is_running():
+            try:
+                chunk = client.recv(65536)
+            except socket.timeout:
+                continue
+            if not chunk:
+                break
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                _dispatch(line, on_message)
+        _dispatch(buffer, on_message)
+    except OSError:
+        pass
+    finally:
+        client.close()
+
+def _dispatch(line, on_message):
+    line = line.strip()
+    if not line:
+        return
+    try:
+        on_message(json.loads(line.decode('utf-8')))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        pass
+
+def serve_status(on_message, is_running, host=STATUS_HOST, port=STATUS_PORT):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.settimeout(1.0)
+    server.listen(5)
+    try:
+        while is_running():
+            try:
+                client, _ = server.accept()
+            except socket.timeout:
+                continue
+            threading.Thread(target=read_messages, args=(client, on_message, is_running), daemon=True).start()
+    finally:
+        server.close()
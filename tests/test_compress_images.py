@@ -0,0 +1,90 @@
+import os
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+pytest.importorskip("cv2")
+compress_images = pytest.importorskip("compress_images")
+
+SETTINGS = {"quality": 50, "brightness": 1.0, "contrast": 1.0, "sharpness": 1.0,
+            "target_size": 200 * 1024, "allow_downscale": False, "min_quality": 20}
+
+@pytest.fixture(autouse=True)
+def no_trace(monkeypatch):
+    monkeypatch.setenv("IMS_TRACE", "0")
+
+def make_dataset(data_dir):
+    for class_name in ("bolt", "nut"):
+        os.makedirs(data_dir / class_name)
+        for i in range(2):
+            image = Image.effect_noise((128, 96), 64 + i * 16).convert("RGB")
+            image.save(data_dir / class_name / f"{class_name}_{i + 1:03d}.jpg", quality=95)
+
+def snapshot(data_dir):
+    files = {}
+    for root, _, names in os.walk(data_dir):
+        for name in names:
+            if name.endswith(".jpg"):
+                path = os.path.join(root, name)
+                files[path] = (os.stat(path).st_mtime_ns, open(path, "rb").read())
+    return files
+
+def run(root_dir, settings=SETTINGS, **kwargs):
+    messages = []
+    result = compress_images.run_batch(str(root_dir), "compress", settings, workers=1,
+                                       on_progress=lambda done, total, message: messages.append(message), **kwargs)
+    return result, messages[-1]
+
+def test_class_run_then_data_root_run_does_not_reencode(tmp_path):
+    data_dir = tmp_path / "data"
+    make_dataset(data_dir)
+    for class_name in ("bolt", "nut"):
+        (processed, total), summary = run(data_dir / class_name)
+        assert (processed, total) == (2, 2)
+        assert "(0 already up to date)" in summary
+    before = snapshot(data_dir)
+    (processed, total), summary = run(data_dir)
+    assert (processed, total) == (4, 4)
+    assert "(4 already up to date)" in summary
+    assert snapshot(data_dir) == before
+
+def test_changed_settings_and_force_reprocess(tmp_path):
+    data_dir = tmp_path / "data"
+    make_dataset(data_dir)
+    run(data_dir)
+    _, summary = run(data_dir, force=True)
+    assert "(0 already up to date)" in summary
+    _, summary = run(data_dir / "bolt")
+    assert "(2 already up to date)" in summary
+    _, summary = run(data_dir / "bolt", settings={**SETTINGS, "quality": 60})
+    assert "(0 already up to date)" in summary
+
+def test_output_dir_leaves_input_untouched(tmp_path):
+    data_dir = tmp_path / "data"
+    output_dir = tmp_path / "out"
+    make_dataset(data_dir)
+    before = snapshot(data_dir)
+    run(data_dir, output_dir=str(output_dir))
+    assert snapshot(data_dir) == before
+    assert sorted(os.listdir(output_dir / "bolt")) == [".ims_compress_ledger.json", "bolt_001.jpg", "bolt_002.jpg"]
+    _, summary = run(data_dir, output_dir=str(output_dir))
+    assert "(4 already up to date)" in summary
+
+def test_target_mode_keeps_original_when_target_is_unreachable(tmp_path):
+    path = tmp_path / "noise.jpg"
+    Image.effect_noise((640, 480), 128).convert("RGB").save(path, quality=95)
+    original = path.read_bytes()
+    action = compress_images.fit_target_size(str(path), str(path), 1024)
+    assert action.startswith("Kept original")
+    assert path.read_bytes() == original
+
+def test_stop_before_start_leaves_images_untouched(tmp_path):
+    from control_channel import ControlState
+    data_dir = tmp_path / "data"
+    make_dataset(data_dir)
+    before = snapshot(data_dir)
+    state = ControlState()
+    state.handle("stop")
+    (processed, total), summary = run(data_dir, control_state=state)
+    assert (processed, total) == (0, 4)
+    assert summary.startswith("Stopped")
+    assert snapshot(data_dir) == before
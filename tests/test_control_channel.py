@@ -0,0 +1,50 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from control_channel import ControlState, ControlServer, ControlClient, controlled_map
+
+def test_controlled_map_stops_submitting_after_stop():
+    state = ControlState()
+    started = []
+
+    def work(i):
+        started.append(i)
+        return i
+
+    results = []
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        for index, future in controlled_map(pool, work, [(i,) for i in range(20)], state, window=2):
+            results.append(future.result())
+            if len(results) == 3:
+                state.handle("stop")
+    assert len(results) <= 4
+    assert len(started) == len(results)
+
+def test_controlled_map_waits_while_paused():
+    state = ControlState()
+    state.handle("pause")
+    results = []
+
+    def consume():
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            for _, future in controlled_map(pool, lambda i: i, [(i,) for i in range(5)], state, window=2):
+                results.append(future.result())
+
+    thread = threading.Thread(target=consume)
+    thread.start()
+    thread.join(0.3)
+    assert results == []
+    state.handle("resume")
+    thread.join(5)
+    assert sorted(results) == list(range(5))
+
+def test_server_acks_commands_on_ephemeral_port():
+    state = ControlState()
+    server = ControlServer(state, port=0)
+    port = server.start_with_fallback()
+    client = ControlClient(port=port)
+    try:
+        assert client.send("pause")["paused"] is True
+        assert client.send("stop")["stopping"] is True
+    finally:
+        client.close()
+        server.stop()
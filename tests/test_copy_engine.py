@@ -0,0 +1,51 @@
+import os
+import copy_engine
+from copy_engine import CopyEngine, PART_SUFFIX
+
+class CancelAfter:
+    def __init__(self, checks):
+        self.checks = checks
+
+    def is_set(self):
+        self.checks -= 1
+        return self.checks < 0
+
+    def set(self):
+        self.checks = -1
+
+def run(engine):
+    engine.start()
+    engine.thread.join()
+    return engine.snapshot()
+
+def make_source(tmp_path, size):
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    data = os.urandom(size)
+    (src_dir / "model.h5").write_bytes(data)
+    return src_dir, data
+
+def test_interrupted_copy_resumes(tmp_path, monkeypatch):
+    monkeypatch.setattr(copy_engine, "CHUNK_SIZE", 1024)
+    src_dir, data = make_source(tmp_path, 10 * 1024)
+    dst_dir = tmp_path / "dst"
+    first = CopyEngine([(src_dir, dst_dir)], workers=1, link_mode="reflink")
+    first.cancel_event = CancelAfter(3)
+    run(first)
+    part = dst_dir / ("model.h5" + PART_SUFFIX)
+    assert part.stat().st_size == 2 * 1024
+    assert not (dst_dir / "model.h5").exists()
+    for link_mode in ("reflink", "hardlink"):
+        snapshot = run(CopyEngine([(src_dir, dst_dir)], workers=1, link_mode=link_mode))
+        assert (snapshot["resumed"], snapshot["copied"]) == (1, 0)
+        assert (dst_dir / "model.h5").read_bytes() == data
+        assert not part.exists()
+        (dst_dir / "model.h5").unlink()
+        part.write_bytes(data[:2 * 1024])
+
+def test_unchanged_files_are_skipped(tmp_path):
+    src_dir, _ = make_source(tmp_path, 4096)
+    dst_dir = tmp_path / "dst"
+    run(CopyEngine([(src_dir, dst_dir)], workers=1, link_mode="copy"))
+    snapshot = run(CopyEngine([(src_dir, dst_dir)], workers=1, link_mode="copy"))
+    assert snapshot["skipped"] == 1
@@ -5,23 +5,44 @@ from tensorflow import keras
 from tensorflow.keras import layers
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint, Callback
-import socket
-import json
 import platform
 import logging
 import signal
 import threading
+import shutil
+import time
+import datetime
+import json
+import numpy as np
+from PIL import Image
+from status_channel import StatusClient
+from control_channel import ControlState, ControlServer
+from metric_history import MetricHistory
+from process_runner import emit_event
+from ims_logging import setup_logging
+from ims_trace import span, record_span
 
 root_dir = os.environ.get("IMS_INSTALLATION_DIR", os.path.dirname(os.path.abspath(__file__)))
 data_dir = os.environ.get("IMS_DATA_DIR", os.path.join(root_dir, "data"))
 models_dir = os.environ.get("IMS_MODELS_DIR", os.path.join(root_dir, "models"))
 labels_path = os.path.join(models_dir, "labels1.txt")
+preprocessing_path = os.path.join(models_dir, "preprocessing.json")
 model_path = os.path.join(models_dir, "model.h5")
 temp_model_path = os.path.join(models_dir, "model_temp.h5")
 backup_model_path = os.path.join(models_dir, "model_backup.h5")
+metrics_path = os.path.join(models_dir, "training_metrics.json")
+metrics_history_dir = os.path.join(models_dir, "metrics_history")
+student_dir = os.path.join(models_dir, "student")
+student_model_path = os.path.join(student_dir, "model.h5")
+student_labels_path = os.path.join(student_dir, "labels1.txt")
+student_preprocessing_path = os.path.join(student_dir, "preprocessing.json")
+unlabeled_dir = os.environ.get("IMS_UNLABELED_DIR", "")
+image_extensions = ('.jpg', '.jpeg', '.png')
 
 training_interrupted = False
 stop_training_event = threading.Event()
+control_state = ControlState(stop_training_event)
+control_server = ControlServer(control_state)
 
 def get_gpu_info():
     gpus = tf.config.list_physical_devices('GPU')
@@ -41,8 +62,22 @@ def get_gpu_info():
     
     return ", ".join(gpu_info)
 
-class StopTrainingCallback(Callback):
+class TrainingControlCallback(Callback):
+    def __init__(self, checkpoint_path=temp_model_path):
+        super().__init__()
+        self.checkpoint_path = checkpoint_path
+
     def on_batch_end(self, batch, logs=None):
+        if control_state.take_checkpoint_request() and self.checkpoint_path:
+            try:
+                self.model.save(self.checkpoint_path)
+                logging.info(f"Checkpoint saved on request to {self.checkpoint_path}")
+            except Exception as e:
+                logging.error(f"Failed to save requested checkpoint: {e}")
+        if control_state.paused:
+            logging.info("Training paused")
+            control_state.wait_if_paused()
+            logging.info("Training resumed")
         if stop_training_event.is_set():
             self.model.stop_training = True
             global training_interrupted
@@ -50,10 +85,15 @@ class StopTrainingCallback(Callback):
             logging.info("Training stopped by user")
 
 class StatusCallback(Callback):
-    def __init__(self):
+    def __init__(self, checkpoint_path=temp_model_path, deadline=None, job_name="train"):
         super().__init__()
+        self.checkpoint_path = checkpoint_path
+        self.deadline = deadline
+        self.client = StatusClient(job_name)
         self.epoch = 0
         self.total_epochs = 0
+        self.epoch_start = None
+        self.epoch_durations = []
         self.system_info = {
             "python_version": platform.python_version(),
             "tensorflow_version": tf.__version__,
@@ -76,8 +116,25 @@ class StatusCallback(Callback):
         logging.info(f"TensorFlow Version: {self.system_info['tensorflow_version']}")
         logging.info(f"GPU Information: {self.system_info['gpu_info']}")
         
+    def estimate_eta(self, batch=None):
+        if self.epoch_start is None:
+            return None
+        steps = self.params.get('steps') or 1
+        done = (batch + 1) / steps if batch is not None else 1.0
+        if self.epoch_durations:
+            epoch_time = sum(self.epoch_durations[-3:]) / len(self.epoch_durations[-3:])
+        elif batch is not None:
+            epoch_time = (time.time() - self.epoch_start) / done
+        else:
+            return None
+        eta = (self.total_epochs - self.epoch + 1 - done) * epoch_time
+        if self.deadline is not None:
+            eta = min(eta, max(0.0, self.deadline - time.time()))
+        return int(eta)
+
     def on_epoch_begin(self, epoch, logs=None):
         self.epoch = epoch + 1
+        self.epoch_start = time.time()
         self.send_status({
             **self.system_info,
             'message': f'Starting epoch {self.epoch}/{self.total_epochs}',
@@ -88,23 +145,27 @@ class StatusCallback(Callback):
         })
         
     def on_batch_end(self, batch, logs=None):
-        if batch % 10 == 0:
-            batch_total = self.params['steps']
-            self.send_status({
-                **self.system_info,
-                'message': f'Epoch {self.epoch}/{self.total_epochs}, Batch {batch+1}/{batch_total}',
-                'epoch': self.epoch,
-                'total_epochs': self.total_epochs,
-                'progress': int(((self.epoch - 1) + (batch + 1) / batch_total) / self.total_epochs * 100),
-                'loss': logs.get('loss', 0),
-                'accuracy': logs.get('accuracy', 0),
-                'can_interrupt': True
-            })
+        batch_total = self.params['steps']
+        self.send_status({
+            'message': f'Epoch {self.epoch}/{self.total_epochs}, Batch {batch+1}/{batch_total}',
+            'epoch': self.epoch,
+            'total_epochs': self.total_epochs,
+            'batch': batch + 1,
+            'total_batches': batch_total,
+            'progress': int(((self.epoch - 1) + (batch + 1) / batch_total) / self.total_epochs * 100),
+            'loss': logs.get('loss', 0),
+            'accuracy': logs.get('accuracy', 0),
+            'eta_seconds': self.estimate_eta(batch),
+            'throughput': (batch + 1) / max(time.time() - self.epoch_start, 1e-6),
+            'throughput_unit': 'batches/s',
+            'can_interrupt': True
+        })
             
     def on_epoch_end(self, epoch, logs=None):
-        if not stop_training_event.is_set():
+        self.epoch_durations.append(time.time() - self.epoch_start)
+        if self.checkpoint_path and not stop_training_event.is_set():
             try:
-                self.model.save(temp_model_path)
+                self.model.save(self.checkpoint_path)
                 logging.info(f"Temporary model saved at epoch {self.epoch}")
             except Exception as e:
                 logging.error(f"Failed to save temporary model: {e}")
@@ -119,6 +180,7 @@ class StatusCallback(Callback):
             'accuracy': logs.get('accuracy', 0),
             'val_loss': logs.get('val_loss', 0),
             'val_accuracy': logs.get('val_accuracy', 0),
+            'eta_seconds': self.estimate_eta(),
             'can_interrupt': True
         })
         
@@ -130,18 +192,113 @@ class StatusCallback(Callback):
             'epoch': self.epoch,
             'total_epochs': self.total_epochs,
             'progress': 100,
+            'eta_seconds': 0,
             'can_interrupt': False,
+            'state': 'interrupted' if training_interrupted else 'finished',
             'interrupted': training_interrupted
         })
+        self.client.close()
         
     def send_status(self, data):
-        try:
-            client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            client.connect(("127.0.0.1", 5678))
-            client.sendall(json.dumps(data).encode('utf-8'))
-            client.close()
-        except:
-            pass
+        self.client.send({'state': 'running', 'control_port': control_server.port, **data})
+
+class MetricHistoryCallback(Callback):
+    def __init__(self, path=metrics_path, archive_dir=metrics_history_dir):
+        super().__init__()
+        self.path = path
+        self.run_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.archive_path = os.path.join(archive_dir, f"run_{self.run_id}.json")
+        self.history = MetricHistory()
+        self.epoch = 0
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch = epoch
+
+    def on_batch_end(self, batch, logs=None):
+        x = self.epoch + (batch + 1) / (self.params.get('steps') or 1)
+        for name in ('loss', 'accuracy'):
+            self.history.record(f"batch_{name}", x, (logs or {}).get(name))
+
+    def on_epoch_end(self, epoch, logs=None):
+        for name, value in (logs or {}).items():
+            self.history.record(f"epoch_{name}", epoch + 1, value)
+        self.save()
+
+    def on_train_end(self, logs=None):
+        self.save()
+
+    def save(self):
+        for path in (self.path, self.archive_path):
+            try:
+                self.history.save(path, run_id=self.run_id, epochs=self.params.get('epochs'))
+            except Exception as e:
+                logging.error(f"Failed to save metric history to {path}: {e}")
+
+class TimeBudgetCallback(Callback):
+    def __init__(self, deadline):
+        super().__init__()
+        self.deadline = deadline
+        self.epoch_start = None
+        self.epoch_durations = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start = time.time()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.epoch_durations.append(time.time() - self.epoch_start)
+        forecast = max(self.epoch_durations[-3:])
+        remaining = self.deadline - time.time()
+        if remaining < forecast:
+            self.model.stop_training = True
+            logging.info(f"Time budget: stopping after epoch {epoch + 1}, next epoch needs ~{forecast:.0f}s but only {remaining:.0f}s remain")
+
+class EpochTraceCallback(Callback):
+    def __init__(self):
+        super().__init__()
+        self.epoch_start = None
+        self.epoch_perf_start = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start = time.time()
+        self.epoch_perf_start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        metrics = {name: float(value) for name, value in (logs or {}).items()}
+        record_span("epoch", self.epoch_start, time.perf_counter() - self.epoch_perf_start, epoch=epoch + 1, **metrics)
+
+def parse_duration(value):
+    value = str(value).strip().lower()
+    if not value:
+        return 0
+    units = {"s": 1, "m": 60, "h": 3600}
+    if value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+def plan_time_budget(model, train_source, val_data, num_epochs, deadline, calibration_steps=6):
+    step_times = []
+    for i in range(min(calibration_steps, len(train_source))):
+        batch = train_source[i]
+        start = time.time()
+        model.train_on_batch(*batch)
+        step_times.append(time.time() - start)
+    step_time = float(np.median(step_times[1:] if len(step_times) > 1 else step_times))
+    val_step_time = step_time * 0.35
+    remaining = deadline - time.time()
+    full_epoch = len(train_source) * step_time + len(val_data) * val_step_time
+    min_epochs = min(num_epochs, 3)
+    if full_epoch * min_epochs <= remaining:
+        epochs = max(1, min(num_epochs, int(remaining // full_epoch)))
+        steps, val_steps = len(train_source), len(val_data)
+    else:
+        epochs = min_epochs
+        epoch_budget = remaining / epochs
+        val_steps = max(1, min(len(val_data), int(epoch_budget * 0.15 // val_step_time)))
+        steps = max(1, min(len(train_source), int((epoch_budget - val_steps * val_step_time) // step_time)))
+    patience = max(1, epochs // 4)
+    logging.info(f"Time budget: {remaining:.0f}s left after calibration, {step_time * 1000:.0f} ms/step; "
+                 f"planning {epochs} epochs x {steps} steps ({val_steps} validation steps), patience {patience}")
+    return epochs, steps, val_steps, patience
 
 def signal_handler(sig, frame):
     stop_training_event.set()
@@ -182,6 +339,70 @@ def create_data_generator():
 
     return train_data, val_data
 
+class BalancedSampler(keras.utils.Sequence):
+    def __init__(self, directory_iterator, quota, reweight="balanced", batch_size=32, seed=None):
+        super().__init__()
+        self.filepaths = np.array(directory_iterator.filepaths)
+        self.classes = np.array(directory_iterator.classes)
+        self.num_classes = directory_iterator.num_classes
+        self.target_size = directory_iterator.target_size
+        self.datagen = directory_iterator.image_data_generator
+        self.quota = quota
+        self.reweight = reweight
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+        self.class_members = [np.flatnonzero(self.classes == c) for c in range(self.num_classes)]
+        self.cursors = [0] * self.num_classes
+        for members in self.class_members:
+            self.rng.shuffle(members)
+        self.on_epoch_end()
+
+    def _draw(self, c):
+        members = self.class_members[c]
+        take = min(self.quota, len(members))
+        start = self.cursors[c]
+        picked = np.take(members, np.arange(start, start + take), mode='wrap')
+        self.cursors[c] = (start + take) % max(len(members), 1)
+        return picked
+
+    def __len__(self):
+        return int(np.ceil(len(self.epoch_indices) / self.batch_size))
+
+    def __getitem__(self, idx):
+        indices = self.epoch_indices[idx * self.batch_size:(idx + 1) * self.batch_size]
+        x = np.zeros((len(indices),) + self.target_size + (3,), dtype=np.float32)
+        for i, index in enumerate(indices):
+            img = keras.utils.img_to_array(keras.utils.load_img(self.filepaths[index], target_size=self.target_size))
+            x[i] = self.datagen.standardize(self.datagen.random_transform(img))
+        y = keras.utils.to_categorical(self.classes[indices], self.num_classes)
+        return x, y, self.class_weights[self.classes[indices]]
+
+    def on_epoch_end(self):
+        drawn = [self._draw(c) for c in range(self.num_classes)]
+        self.epoch_indices = np.concatenate(drawn)
+        self.rng.shuffle(self.epoch_indices)
+        counts = np.array([len(d) for d in drawn], dtype=np.float64)
+        available = np.array([len(m) for m in self.class_members], dtype=np.float64)
+        if self.reweight == "prior":
+            weights = (available / available.sum()) / np.maximum(counts / counts.sum(), 1e-12)
+        else:
+            weights = self.quota / np.maximum(counts, 1)
+        weights[counts == 0] = 0
+        self.class_weights = (weights / np.average(weights, weights=counts)).astype(np.float32)
+
+def create_balanced_sampler(train_data):
+    quota = int(os.environ.get("IMS_CLASS_QUOTA", 0))
+    budget = int(os.environ.get("IMS_EPOCH_BUDGET", 0))
+    if budget > 0:
+        quota = max(1, budget // train_data.num_classes)
+    if quota <= 0:
+        return train_data
+    reweight = os.environ.get("IMS_SAMPLER_REWEIGHT", "balanced")
+    sampler = BalancedSampler(train_data, quota, reweight=reweight, batch_size=train_data.batch_size)
+    logging.info(f"Balanced sampler: {quota} images per class, {len(sampler.epoch_indices)} per epoch "
+                 f"instead of {train_data.samples} ({reweight} weighting)")
+    return sampler
+
 def build_model(num_classes):
     base_model = keras.applications.MobileNetV2(
         input_shape=(224, 224, 3),
@@ -208,6 +429,256 @@ def build_model(num_classes):
     
     return model
 
+def read_labels(path):
+    labels = {}
+    with open(path, "r") as f:
+        for line in f:
+            if ": " in line:
+                index, name = line.strip().split(": ", 1)
+                labels[int(index)] = name
+    return labels
+
+def detect_preprocessing(class_indices, sample=20):
+    classes = {}
+    for label in class_indices:
+        class_dir = os.path.join(data_dir, label)
+        names = sorted(n for n in os.listdir(class_dir) if n.lower().endswith(image_extensions))[:sample]
+        square = 0
+        for name in names:
+            try:
+                with Image.open(os.path.join(class_dir, name)) as img:
+                    square += img.size == (224, 224)
+            except OSError:
+                continue
+        classes[label] = "letterbox" if names and square * 2 > len(names) else "resize"
+    letterboxed = sum(1 for mode in classes.values() if mode == "letterbox")
+    mode = "letterbox" if letterboxed * 2 > len(classes) else "resize"
+    mixed = sorted(label for label, class_mode in classes.items() if class_mode != mode)
+    if mixed:
+        logging.warning(f"Classes {', '.join(mixed)} were captured with different preprocessing than the rest "
+                        f"({mode}); recapture them in the same capture mode for consistent predictions")
+    return {"mode": mode, "size": 224, "classes": classes}
+
+def save_preprocessing(path, preprocessing):
+    with open(path, "w") as f:
+        json.dump(preprocessing, f, indent=4)
+
+def build_student(num_classes):
+    student_size = int(os.environ.get("IMS_STUDENT_SIZE", 128))
+    student_alpha = float(os.environ.get("IMS_STUDENT_ALPHA", 0.35))
+    base_model = keras.applications.MobileNetV2(
+        input_shape=(student_size, student_size, 3),
+        include_top=False,
+        alpha=student_alpha,
+        weights='imagenet'
+    )
+
+    inputs = keras.Input(shape=(224, 224, 3))
+    x = layers.Resizing(student_size, student_size)(inputs)
+    x = base_model(x)
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.Dropout(0.2)(x)
+    logits = layers.Dense(num_classes, name="student_logits")(x)
+    outputs = layers.Softmax()(logits)
+
+    return keras.Model(inputs, logits), keras.Model(inputs, outputs)
+
+def list_distillation_files(class_names):
+    files = []
+    for index, label in sorted(class_names.items()):
+        class_dir = os.path.join(data_dir, label)
+        if not os.path.isdir(class_dir):
+            logging.warning(f"No data folder for class '{label}', skipping")
+            continue
+        for name in sorted(os.listdir(class_dir)):
+            if name.lower().endswith(image_extensions):
+                files.append((os.path.join(class_dir, name), index))
+    if unlabeled_dir and os.path.isdir(unlabeled_dir):
+        for root, _, names in os.walk(unlabeled_dir):
+            for name in sorted(names):
+                if name.lower().endswith(image_extensions):
+                    files.append((os.path.join(root, name), -1))
+    return files
+
+def load_image_batch(paths):
+    batch = np.zeros((len(paths), 224, 224, 3), dtype=np.float32)
+    for i, path in enumerate(paths):
+        img = keras.utils.load_img(path, target_size=(224, 224))
+        batch[i] = keras.utils.img_to_array(img) / 255.0
+    return batch
+
+def compute_soft_labels(teacher, paths, temperature, batch_size=32):
+    soft_labels = []
+    for start in range(0, len(paths), batch_size):
+        probs = teacher.predict_on_batch(load_image_batch(paths[start:start + batch_size]))
+        probs = np.clip(np.asarray(probs, dtype=np.float64), 1e-8, 1.0) ** (1.0 / temperature)
+        soft_labels.append(probs / probs.sum(axis=1, keepdims=True))
+        if stop_training_event.is_set():
+            break
+    return np.concatenate(soft_labels).astype(np.float32)
+
+class DistillationSequence(keras.utils.Sequence):
+    def __init__(self, paths, labels, soft_labels, num_classes, batch_size=32, augment=False):
+        super().__init__()
+        self.paths = np.array(paths)
+        self.labels = np.array(labels)
+        self.soft_labels = soft_labels
+        self.num_classes = num_classes
+        self.batch_size = batch_size
+        self.datagen = ImageDataGenerator(
+            rotation_range=15,
+            width_shift_range=0.1,
+            height_shift_range=0.1,
+            zoom_range=0.1,
+            horizontal_flip=True
+        ) if augment else None
+        self.order = np.arange(len(self.paths))
+        self.on_epoch_end()
+
+    def __len__(self):
+        return int(np.ceil(len(self.paths) / self.batch_size))
+
+    def __getitem__(self, idx):
+        indices = self.order[idx * self.batch_size:(idx + 1) * self.batch_size]
+        x = load_image_batch(self.paths[indices])
+        if self.datagen is not None:
+            x = np.stack([self.datagen.random_transform(img) for img in x])
+        y = np.zeros((len(indices), 2 * self.num_classes + 1), dtype=np.float32)
+        y[:, :self.num_classes] = self.soft_labels[indices]
+        labeled = self.labels[indices] >= 0
+        y[labeled, self.num_classes + self.labels[indices][labeled]] = 1.0
+        y[:, 2 * self.num_classes] = labeled
+        return x, y
+
+    def on_epoch_end(self):
+        if self.datagen is not None:
+            np.random.shuffle(self.order)
+
+def distillation_loss(num_classes, temperature, alpha):
+    def loss(y_true, logits):
+        soft = y_true[:, :num_classes]
+        hard = y_true[:, num_classes:2 * num_classes]
+        labeled = y_true[:, 2 * num_classes]
+        soft_loss = keras.losses.kl_divergence(soft, tf.nn.softmax(logits / temperature)) * temperature ** 2
+        hard_loss = keras.losses.categorical_crossentropy(hard, logits, from_logits=True)
+        return (1.0 - alpha) * soft_loss + alpha * labeled * hard_loss
+    return loss
+
+def teacher_agreement(num_classes):
+    def agreement(y_true, logits):
+        return tf.cast(tf.equal(tf.argmax(y_true[:, :num_classes], axis=1), tf.argmax(logits, axis=1)), tf.float32)
+    return keras.metrics.MeanMetricWrapper(agreement, name='accuracy')
+
+def measure_latency(model, runs=20):
+    sample = np.random.rand(1, 224, 224, 3).astype(np.float32)
+    model.predict_on_batch(sample)
+    start = time.perf_counter()
+    for _ in range(runs):
+        model.predict_on_batch(sample)
+    return (time.perf_counter() - start) / runs * 1000
+
+def distill(num_epochs):
+    if not os.path.exists(model_path) or not os.path.exists(labels_path):
+        logging.error("Distillation requires a trained model.h5 and labels1.txt")
+        print("Error: Distillation requires a trained model.h5 and labels1.txt")
+        return
+    temperature = float(os.environ.get("IMS_DISTILL_TEMPERATURE", 4.0))
+    alpha = float(os.environ.get("IMS_DISTILL_ALPHA", 0.3))
+    with span("model_load", path=model_path):
+        teacher = keras.models.load_model(model_path)
+    class_names = read_labels(labels_path)
+    num_classes = len(class_names)
+    files = list_distillation_files(class_names)
+    if not files:
+        logging.error(f"No images found for distillation in {data_dir}")
+        print(f"Error: No images found for distillation in {data_dir}")
+        return
+    paths = [path for path, _ in files]
+    labels = np.array([label for _, label in files])
+    logging.info(f"Distilling {num_classes} classes from {len(paths)} images ({int((labels < 0).sum())} unlabeled), T={temperature}, alpha={alpha}")
+    with span("inference", model="teacher", images=len(paths)):
+        soft_labels = compute_soft_labels(teacher, paths, temperature)
+    if stop_training_event.is_set():
+        logging.info("Distillation stopped by user before training")
+        return
+
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(paths))
+    labeled_order = order[labels[order] >= 0]
+    val_indices = labeled_order[:int(len(labeled_order) * 0.2)]
+    train_indices = np.setdiff1d(order, val_indices)
+    train_seq = DistillationSequence([paths[i] for i in train_indices], labels[train_indices],
+                                     soft_labels[train_indices], num_classes, augment=True)
+    val_seq = DistillationSequence([paths[i] for i in val_indices], labels[val_indices],
+                                   soft_labels[val_indices], num_classes)
+
+    logits_model, student = build_student(num_classes)
+    logits_model.compile(
+        optimizer=keras.optimizers.Adam(learning_rate=5e-4),
+        loss=distillation_loss(num_classes, temperature, alpha),
+        metrics=[teacher_agreement(num_classes)]
+    )
+    logits_model.fit(
+        train_seq,
+        validation_data=val_seq,
+        epochs=num_epochs,
+        callbacks=[
+            StatusCallback(checkpoint_path=None, job_name="distill"),
+            TrainingControlCallback(checkpoint_path=None),
+            EpochTraceCallback(),
+            EarlyStopping(patience=5, restore_best_weights=True)
+        ]
+    )
+
+    val_paths = [paths[i] for i in val_indices]
+    if val_paths:
+        correct = {"teacher": 0, "student": 0}
+        for start in range(0, len(val_paths), 32):
+            batch = load_image_batch(val_paths[start:start + 32])
+            truth = labels[val_indices[start:start + 32]]
+            correct["teacher"] += int((np.argmax(teacher.predict_on_batch(batch), axis=1) == truth).sum())
+            correct["student"] += int((np.argmax(student.predict_on_batch(batch), axis=1) == truth).sum())
+        logging.info(f"Validation accuracy: teacher {correct['teacher'] / len(val_paths):.2%}, student {correct['student'] / len(val_paths):.2%}")
+    teacher_ms = measure_latency(teacher)
+    student_ms = measure_latency(student)
+    logging.info(f"Per-frame latency: teacher {teacher_ms:.1f} ms, student {student_ms:.1f} ms ({teacher_ms / student_ms:.1f}x faster)")
+
+    os.makedirs(student_dir, exist_ok=True)
+    student.save(student_model_path)
+    shutil.copy2(labels_path, student_labels_path)
+    if os.path.exists(preprocessing_path):
+        shutil.copy2(preprocessing_path, student_preprocessing_path)
+    logging.info(f"Student model saved to {student_model_path}")
+    print(f"Student model saved to {student_model_path}")
+
+def warm_start_head(model, previous_model_path, previous_labels, class_indices):
+    with span("model_load", path=previous_model_path):
+        previous = keras.models.load_model(previous_model_path, compile=False)
+    old_dense = [layer for layer in previous.layers if isinstance(layer, layers.Dense)]
+    new_dense = [layer for layer in model.layers if isinstance(layer, layers.Dense)]
+    if len(old_dense) != len(new_dense) or old_dense[-1].units != len(previous_labels):
+        logging.warning("Previous model head does not match, skipping warm start")
+        return 0
+    for old_layer, new_layer in zip(old_dense[:-1], new_dense[:-1]):
+        if [w.shape for w in old_layer.get_weights()] != [w.shape for w in new_layer.get_weights()]:
+            logging.warning(f"Layer {new_layer.name} shape changed, skipping warm start")
+            return 0
+        new_layer.set_weights(old_layer.get_weights())
+    old_kernel, old_bias = old_dense[-1].get_weights()
+    kernel, bias = new_dense[-1].get_weights()
+    if old_kernel.shape[0] != kernel.shape[0]:
+        logging.warning("Output layer input size changed, skipping warm start")
+        return 0
+    old_index = {name: index for index, name in previous_labels.items()}
+    mapped = 0
+    for label, index in class_indices.items():
+        if label in old_index:
+            kernel[:, index] = old_kernel[:, old_index[label]]
+            bias[index] = old_bias[old_index[label]]
+            mapped += 1
+    new_dense[-1].set_weights([kernel, bias])
+    return mapped
+
 def backup_existing_model():
     if os.path.exists(model_path):
         try:
@@ -243,80 +714,45 @@ def restore_from_backup():
     
     return False
 
-class SimpleStopHandler:
-    def __init__(self, stop_event):
-        self.stop_event = stop_event
-        self.running = False
-        self.server_thread = None
-    
-    def start(self):
-        self.running = True
-        self.server_thread = threading.Thread(target=self._command_server, daemon=True)
-        self.server_thread.start()
-        self.file_check_thread = threading.Thread(target=self._check_signal_file, daemon=True)
-        self.file_check_thread.start()
-    
-    def stop(self):
-        self.running = False
-    
-    def _command_server(self):
-        try:
-            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            server.bind(("127.0.0.1", 5679))
-            server.settimeout(1.0)
-            server.listen(1)
-            
-            while self.running:
-                try:
-                    client, _ = server.accept()
-                    data = client.recv(1024)
-                    try:
-                        message = json.loads(data.decode('utf-8'))
-                        if message.get("command") == "stop":
-                            self.stop_event.set()
-                            logging.info("Stop command received via socket")
-                    except:
-                        pass
-                    client.close()
-                except socket.timeout:
-                    continue
-                except:
-                    break
-            server.close()
-        except Exception as e:
-            logging.error(f"Command server error: {e}")
-    
-    def _check_signal_file(self):
-        signal_file = os.path.join(root_dir, "stop_training.signal")
-        while self.running:
-            if os.path.exists(signal_file):
-                self.stop_event.set()
-                logging.info("Stop signal file detected")
-                try:
-                    os.remove(signal_file)
-                except:
-                    pass
-                break
-            threading.Event().wait(0.5)
-
 def main():
-    logging.basicConfig(filename=os.path.join(root_dir, "ims_debug.log"), level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    start_time = time.time()
+    setup_logging(root_dir, os.environ.get("IMS_TRAIN_MODE", "train"))
     logging.info(f"Starting training with TensorFlow {tf.__version__}")
     logging.info(f"Root directory: {root_dir}")
     logging.info(f"Data directory: {data_dir}")
     logging.info(f"Models directory: {models_dir}")
     signal.signal(signal.SIGINT, signal_handler)
-    stop_handler = SimpleStopHandler(stop_training_event)
-    stop_handler.start()
+    stop_handler = control_server
+    stop_handler.start_with_fallback()
     os.makedirs(models_dir, exist_ok=True)
+    try:
+        num_epochs = int(os.environ.get("IMS_EPOCHS", 10))
+    except ValueError:
+        raise ValueError("Invalid value for IMS_EPOCHS. Please provide a valid integer.")
+    if os.environ.get("IMS_TRAIN_MODE", "train") == "distill":
+        try:
+            distill(num_epochs)
+        except Exception as e:
+            logging.exception(f"Distillation error: {e}")
+        finally:
+            stop_handler.stop()
+        return
     if not os.path.exists(data_dir):
         logging.error(f"Data directory does not exist: {data_dir}")
         print(f"Error: Data directory does not exist: {data_dir}")
         return
+    previous_labels = {}
+    if os.path.exists(labels_path):
+        try:
+            previous_labels = read_labels(labels_path)
+        except Exception as e:
+            logging.warning(f"Failed to read previous labels: {e}")
     has_backup = backup_existing_model()
     try:
-        train_data, val_data = create_data_generator()
+        with span("dataset_scan", directory=data_dir) as scan_span:
+            train_data, val_data = create_data_generator()
+            train_source = create_balanced_sampler(train_data)
+            scan_span.set(images=train_data.samples + val_data.samples, classes=len(train_data.class_indices))
     except Exception as e:
         logging.error(f"Failed to create data generator: {e}")
         print(f"Error: Failed to create data generator: {e}")
@@ -324,27 +760,47 @@ def main():
     with open(labels_path, "w") as f:
         for label, index in train_data.class_indices.items():
             f.write(f"{index}: {label}\n")
+    preprocessing = detect_preprocessing(train_data.class_indices)
+    save_preprocessing(preprocessing_path, preprocessing)
+    logging.info(f"Inference preprocessing: {preprocessing['mode']} to {preprocessing['size']}px")
     model = build_model(len(train_data.class_indices))
+    if has_backup and previous_labels and os.environ.get("IMS_WARM_START", "1") == "1":
+        try:
+            mapped = warm_start_head(model, backup_model_path, previous_labels, train_data.class_indices)
+            logging.info(f"Warm start: reused head weights for {mapped}/{len(train_data.class_indices)} classes, "
+                         f"{len(train_data.class_indices) - mapped} new")
+        except Exception as e:
+            logging.warning(f"Warm start failed, training head from scratch: {e}")
     try:
-        num_epochs = int(os.environ.get("IMS_EPOCHS", 10))
+        time_budget = parse_duration(os.environ.get("IMS_TIME_BUDGET", ""))
     except ValueError:
-        raise ValueError("Invalid value for IMS_EPOCHS. Please provide a valid integer.")
-    status_callback = StatusCallback()
-    stop_callback = StopTrainingCallback()
+        raise ValueError("Invalid value for IMS_TIME_BUDGET. Use seconds or a value like '5m' or '1h'.")
+    deadline = start_time + time_budget if time_budget > 0 else None
+    steps_per_epoch = None
+    validation_steps = None
+    patience = 5
+    status_callback = StatusCallback(deadline=deadline)
+    stop_callback = TrainingControlCallback()
+    callbacks = [status_callback, stop_callback, MetricHistoryCallback(), EpochTraceCallback()]
     try:
+        if deadline is not None:
+            num_epochs, steps_per_epoch, validation_steps, patience = plan_time_budget(
+                model, train_source, val_data, num_epochs, deadline)
+            callbacks.append(TimeBudgetCallback(deadline))
         model.fit(
-            train_data,
+            train_source,
             validation_data=val_data,
             epochs=num_epochs,
-            callbacks=[
-                status_callback,
-                stop_callback,
-                EarlyStopping(patience=5),
+            steps_per_epoch=steps_per_epoch,
+            validation_steps=validation_steps,
+            callbacks=callbacks + [
+                EarlyStopping(patience=patience),
                 ModelCheckpoint(model_path, save_best_only=True)
             ]
         )
 
         if training_interrupted:
+            emit_event("interrupted")
             logging.info("Training was interrupted, checking for model to use...")
             restored = restore_from_backup()
             if not restored: